@@ -0,0 +1,27 @@
+"""Times canonicalize_line_order on a long straight-line function, like those produced by inlining large games.
+
+Usage: env PYTHONPATH=. python benchmarks/line_order.py [number of statements]"""
+import ast
+import sys
+import time
+
+from gamehop.verification import canonicalization
+
+def long_function(n: int) -> ast.FunctionDef:
+    """Returns a function of n statements, each depending on the previous one and on one halfway back."""
+    lines = ["def f(a):", "    x0 = g(a)"]
+    for i in range(1, n - 1):
+        lines.append(f"    x{i} = g(x{i - 1}, x{i // 2})")
+    lines.append(f"    return x{n - 2}")
+    fdef = ast.parse("\n".join(lines)).body[0]
+    assert isinstance(fdef, ast.FunctionDef)
+    return fdef
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    # the graph traversals recurse once per statement in a dependency chain
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * n))
+    fdef = long_function(n)
+    start = time.perf_counter()
+    canonicalization.canonicalize_line_order(fdef)
+    print(f"canonicalize_line_order, {n} statements: {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,67 @@
+"""Measures memory use while running example proofs: the peak memory traced by tracemalloc, both overall and
+within a single call to canonicalize_game (above the memory in use when it was called), and the number of
+scope.Scope and scope.ObjectValue objects created.
+
+Usage: env PYTHONPATH=. python benchmarks/memory.py [example ...]
+where each example is a directory under examples/ (default: all of them)."""
+import contextlib
+import glob
+import io
+import os
+import runpy
+import sys
+import tracemalloc
+
+from gamehop import scope
+import gamehop.verification as verification
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+def count_instances(cls, counts, name):
+    """Wraps cls.__init__ to count the instances created in counts[name]."""
+    init = cls.__init__
+    def counting_init(self, *args, **kwargs):
+        counts[name] += 1
+        init(self, *args, **kwargs)
+    cls.__init__ = counting_init
+
+def measure_peaks(peaks):
+    """Wraps verification.canonicalize_game to record in peaks the traced memory peak of each call."""
+    canonicalize_game = verification.canonicalize_game
+    def measured_canonicalize_game(*args, **kwargs):
+        (current, _) = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        ret = canonicalize_game(*args, **kwargs)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        return ret
+    verification.canonicalize_game = measured_canonicalize_game
+
+def run_example(example: str) -> None:
+    """Runs the proof scripts of the example, discarding their output (including the .tex files they write)."""
+    directory = os.path.join(EXAMPLES_DIR, example)
+    sys.path.insert(0, directory)
+    cwd = os.getcwd()
+    try:
+        for script in sorted(glob.glob(os.path.join(directory, '*_is_*.py'))):
+            with contextlib.redirect_stdout(io.StringIO()):
+                os.chdir(os.path.join(EXAMPLES_DIR, '..'))
+                runpy.run_path(script)
+    finally:
+        os.chdir(cwd)
+        sys.path.pop(0)
+
+if __name__ == '__main__':
+    examples = sys.argv[1:] or sorted(os.path.basename(os.path.dirname(p)) for p in glob.glob(os.path.join(EXAMPLES_DIR, '*', '*_is_*.py')))
+    counts = { 'Scope': 0, 'ObjectValue': 0 }
+    count_instances(scope.Scope, counts, 'Scope')
+    count_instances(scope.ObjectValue, counts, 'ObjectValue')
+    peaks = list()
+    measure_peaks(peaks)
+    for example in examples:
+        for name in counts: counts[name] = 0
+        peaks.clear()
+        tracemalloc.start()
+        run_example(example)
+        (_, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{example}: peak {peak / 1024:,.0f} KiB ({max(peaks, default = 0) / 1024:,.0f} KiB in canonicalize_game), {counts['Scope']:,} Scope and {counts['ObjectValue']:,} ObjectValue objects created")
@@ -0,0 +1,153 @@
+"""Benchmark suite: times the checks of the example proofs and of proofs made by gamehop.synthetic, and the
+canonicalization of synthetic games of increasing size, and compares the times with the baseline stored in
+benchmarks/baseline.json to flag slowdowns.
+
+Usage: env PYTHONPATH=. python benchmarks/suite.py [--repetitions N] [--tolerance T] [--save] [name ...]
+
+Each workload is run N times (default 5) and its fastest time is reported.  A workload is flagged, and the exit status
+is 1, if it is more than T (default 0.5, i.e. 50%) slower than its baseline.  --save stores the times as the new
+baseline instead.  The names given select the workloads whose name starts with one of them.  Baselines are only
+meaningful on the machine they were recorded on, so rerun with --save after switching machines."""
+import argparse
+import contextlib
+import gc
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from gamehop import utils
+import gamehop.check
+from gamehop.synthetic import Synthesizer, hybrid_module, load_module
+import gamehop.verification as verification
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+GAME_HEADER = ["class G(Crypto.Game):", "    def __init__(self, Adversary):", "        self.adversary = Adversary()"]
+
+def straight_line_game(n: int) -> str:
+    """A game whose main method has n statements, each depending on the previous one and on one halfway back."""
+    lines = GAME_HEADER + ["    def main(self) -> Crypto.Bit:", "        x0 = self.adversary.challenge()"]
+    for i in range(1, n - 1):
+        lines.append(f"        x{i} = g(x{i - 1}, x{i // 2})")
+    lines += [f"        r = self.adversary.guess(x{n - 2})", "        return r"]
+    return "\n".join(lines)
+
+def nested_if_game(depth: int) -> str:
+    """A game whose main method has if statements nested depth deep, each branch assigning the same variable."""
+    lines = GAME_HEADER + ["    def main(self) -> Crypto.Bit:", "        x = self.adversary.challenge()", "        y = 0"]
+    indent = "        "
+    for d in range(depth):
+        lines.append(f"{indent}if h(x, {d}):")
+        indent += "    "
+    lines.append(f"{indent}y = g(x, {depth})")
+    for d in reversed(range(depth)):
+        indent = indent[:-4]
+        lines += [f"{indent}else:", f"{indent}    y = g(y, {d})"]
+    lines += ["        r = self.adversary.guess(y)", "        return r"]
+    return "\n".join(lines)
+
+def many_oracles_game(n: int) -> str:
+    """A game with n oracles, each using its own member set by main."""
+    lines = GAME_HEADER + ["    def main(self) -> Crypto.Bit:"]
+    lines += [f"        self.k{i} = Crypto.UniformlySample(K)" for i in range(n)]
+    lines += ["        r = self.adversary.guess()", "        return r"]
+    for i in range(n):
+        lines += [f"    def o_{i}(self, m):", f"        c = g(self.k{i}, m)", "        d = h(c, m)", "        return d"]
+    return "\n".join(lines)
+
+def check_example(script: str) -> None:
+    # start from nothing parsed, as a new process would
+    utils.parse_cache.clear()
+    summary = gamehop.check.check_scripts([script])
+    assert not summary['errors'] and all(result['valid'] for result in summary['proofs']), summary
+
+def check_synthetic(module) -> None:
+    utils.parse_cache.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert module.proof().check()
+
+def workloads(tmpdir: str) -> Dict[str, Callable[[], object]]:
+    ret: Dict[str, Callable[[], object]] = dict()
+    for script in sorted(glob.glob(os.path.join('examples', '*', '*_is_*.py'))):
+        ret['proof/' + os.path.basename(script)[:-3]] = lambda script=script: check_example(script)
+    for n in [10, 100]:
+        synthesizer = Synthesizer(statements = n, if_depth = 2, tuples = True, lambdas = True)
+        module = load_module(synthesizer.proof_module(), tmpdir, f"synthetic_proof_{n}")
+        ret[f'proof/synthetic/{n}'] = lambda module=module: check_synthetic(module)
+    for n in [5, 20]:
+        module = load_module(hybrid_module(n), tmpdir, f"hybrid_proof_{n}")
+        ret[f'proof/hybrid/{n}'] = lambda module=module: check_synthetic(module)
+    for n in [10, 100, 1000]:
+        ret[f'canonicalize/straight_line/{n}'] = lambda src=straight_line_game(n): verification.canonicalize_game(src)
+    # the size of the expressions made from nested ifs grows exponentially with the depth
+    for depth in [2, 4, 6]:
+        ret[f'canonicalize/nested_if/{depth}'] = lambda src=nested_if_game(depth): verification.canonicalize_game(src)
+    for n in [10, 100]:
+        ret[f'canonicalize/many_oracles/{n}'] = lambda src=many_oracles_game(n): verification.canonicalize_game(src)
+    for n in [10, 100, 300]:
+        synthesizer = Synthesizer(statements = n, oracles = 2, if_depth = 2, tuples = True, lambdas = True)
+        ret[f'canonicalize/synthetic/{n}'] = lambda src=synthesizer.game(): verification.canonicalize_game(src)
+    return ret
+
+def measure(workload: Callable[[], object], repetitions: int) -> float:
+    """Returns the fastest of repetitions runs of workload, which is the least disturbed by anything else running.
+    As in timeit, garbage collection is disabled while timing."""
+    best = float('inf')
+    for _ in range(repetitions):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            workload()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+def machine() -> str:
+    return f"{platform.python_implementation()} {platform.python_version()} on {platform.machine()} {platform.system()}"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs = "*")
+    parser.add_argument("--repetitions", type = int, default = 5)
+    parser.add_argument("--tolerance", type = float, default = 0.5)
+    parser.add_argument("--save", action = "store_true")
+    args = parser.parse_args()
+    # the example proofs write their figures relative to the root of the repository
+    os.chdir(ROOT)
+    baseline = { 'machine': None, 'results': dict() }
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as fh: baseline = json.load(fh)
+    if not args.save and baseline['machine'] is not None and baseline['machine'] != machine():
+        print(f"warning: baseline was recorded with {baseline['machine']}, not {machine()}")
+    results: Dict[str, float] = dict()
+    slower: List[str] = list()
+    tmpdir = tempfile.TemporaryDirectory()
+    for name, workload in workloads(tmpdir.name).items():
+        if args.names and not any(name.startswith(prefix) for prefix in args.names): continue
+        results[name] = measure(workload, args.repetitions)
+        line = f"{name:48s} {results[name]:9.4f}s"
+        if name in baseline['results']:
+            ratio = results[name] / baseline['results'][name]
+            line += f"  {ratio:6.2f}x baseline"
+            if ratio > 1 + args.tolerance:
+                line += "  SLOWER"
+                slower.append(name)
+        print(line, flush = True)
+    if args.save:
+        baseline = { 'machine': machine(), 'results': { **baseline['results'], **results } }
+        with open(BASELINE, 'w') as fh:
+            json.dump(baseline, fh, indent = 2, sort_keys = True)
+            fh.write("\n")
+        print(f"saved baseline to {BASELINE}")
+    elif slower:
+        print(f"{len(slower)} workloads more than {args.tolerance:.0%} slower than the baseline: {', '.join(slower)}")
+        sys.exit(1)
@@ -0,0 +1,66 @@
+"""Measures NodeTraverser visits per second while canonicalizing the functions and classes defined at module
+level in the canonicalization tests.
+
+Usage: env PYTHONPATH=. python benchmarks/visits.py [repetitions]
+
+The time reported is that of the fastest repetition."""
+import glob
+import importlib.util
+import inspect
+import os
+import sys
+import time
+
+from gamehop import node_traverser as nt
+import gamehop.verification as verification
+
+def corpus():
+    """Returns the module-level functions and classes of the canonicalization tests that can be canonicalized."""
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'gamehop', 'verification', 'canonicalization')
+    items = []
+    for path in sorted(glob.glob(os.path.join(root, '**', 'test_*.py'), recursive=True)):
+        spec = importlib.util.spec_from_file_location(os.path.basename(path)[:-3], path)
+        assert spec is not None and spec.loader is not None
+        module = importlib.util.module_from_spec(spec)
+        sys.path.insert(0, os.path.dirname(path))
+        try: spec.loader.exec_module(module)
+        finally: sys.path.pop(0)
+        for name, value in vars(module).items():
+            if getattr(value, '__module__', None) != module.__name__: continue
+            if inspect.isfunction(value): items.append((verification.canonicalize_function, value))
+            elif inspect.isclass(value) and not issubclass(value, Exception) and 'TestCase' not in [b.__name__ for b in value.__mro__]: items.append((verification.canonicalize_game, value))
+    # keep only what canonicalizes without errors
+    ok = []
+    for canonicalize, value in items:
+        try: canonicalize(value)
+        except Exception: continue
+        ok.append((canonicalize, value))
+    return ok
+
+def run(items):
+    for canonicalize, value in items: canonicalize(value)
+
+def count_visits(items) -> int:
+    """Runs the corpus once with NodeTraverser.visit wrapped to count the visits."""
+    visits = 0
+    visit = nt.NodeTraverser.visit
+    def counting_visit(self, node):
+        nonlocal visits
+        visits += 1
+        return visit(self, node)
+    nt.NodeTraverser.visit = counting_visit # type: ignore
+    try: run(items)
+    finally: nt.NodeTraverser.visit = visit # type: ignore
+    return visits
+
+if __name__ == '__main__':
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    items = corpus()
+    visits = count_visits(items)
+    # take the fastest repetition, which is the least disturbed by anything else running
+    elapsed = float('inf')
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        run(items)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"{len(items)} functions and classes, {visits} visits in {elapsed:.3f}s: {visits / elapsed:,.0f} visits/s")
@@ -0,0 +1,17 @@
+import argparse
+import sys
+from typing import List, Optional
+
+from . import check
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog = "python -m gamehop")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+    check_parser = subparsers.add_parser("check", help = "check the proofs in proof scripts in a single process, printing a JSON summary")
+    check.add_arguments(check_parser)
+    check_parser.set_defaults(run = check.main)
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import ast
-from typing import Union, List, TypeVar
+import functools
+from typing import Dict, Iterator, Sequence, Tuple, Union, List, TypeVar
 
 T = TypeVar('T')
 def ensure_list(thing: Union[T, List[T]]) -> List[T]:
@@ -38,43 +39,83 @@ def unique_elements(l: List[T]) -> List[T]:
     return ret
 
 
-def attribute_fqn(node: ast.expr) -> List[str]:
-    '''From an attribute node, determine the full name, given as a list of strings.  Handles
-    attributes of attributes etc. recursively.
+def bit_indices(bitset: int) -> Iterator[int]:
+    ''' Yields the indices of the bits set in bitset, from the lowest.'''
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+class FQN(tuple):
+    ''' The full name of a variable or attribute, eg. self.Scheme.Encrypt, as the tuple of its parts.  FQNs are
+    interned (see parts_fqn), so that each name is only split or joined once: an FQN keeps its dotted name, and its
+    parent (the object it is an attribute of, self.Scheme) and attribute path (the name of the attribute relative to
+    the outermost object, Scheme.Encrypt) are only looked up the first time they are needed.'''
+    name: str
+
+    @functools.cached_property
+    def parent(self) -> 'FQN':
+        return parts_fqn(self[:-1])
+
+    @functools.cached_property
+    def attribute_path(self) -> 'FQN':
+        return parts_fqn(self[1:])
+
+_fqns_by_parts: Dict[Tuple[str, ...], FQN] = dict()
+_fqns_by_name: Dict[str, FQN] = dict()
+
+def parts_fqn(parts: Tuple[str, ...]) -> FQN:
+    ''' Returns the interned FQN with the given parts.'''
+    ret = _fqns_by_parts.get(parts)
+    if ret is None:
+        ret = FQN(parts)
+        ret.name = ".".join(parts)
+        _fqns_by_parts[parts] = ret
+        # the empty FQN has the same name as the FQN of the empty string
+        if parts: _fqns_by_name[ret.name] = ret
+    return ret
+
+EMPTY_FQN = parts_fqn(())
+
+def attribute_fqn(node: ast.expr) -> FQN:
+    '''From an attribute node, determine the full name, given as an FQN.  Handles
+    attributes of attributes etc.
     Note that the outer Attribute represents the rightmost name in a full name of an attribute, i.e.
     for a.b.c, the outer Attribute node represents 'c' and the innermost node is a Name with id 'a'.
 
     '''
-    fqn: List[str] = [ ]
-    if isinstance(node, ast.Attribute):
-        val = node.value
-        fqn.insert(0, node.attr)
-        # Keep on adding prefixes (object names) to the varname until we are at the outer name
-        while isinstance(val, ast.Attribute):
-            fqn.insert(0, val.attr)
-            val = val.value
+    parts: List[str] = [ ]
+    val = node
+    # Keep on adding prefixes (object names) to the varname until we are at the outer name
+    while isinstance(val, ast.Attribute):
+        parts.append(val.attr)
+        val = val.value
 
     # At the outer name
     if isinstance(val, ast.Name):
-        fqn.insert(0, val.id)
+        parts.append(val.id)
     elif isinstance(val, ast.arg):
-        fqn.insert(0, val.arg)
+        parts.append(val.arg)
     else:
         # Not sure what else will come up!
         assert(False)
-    
-    return fqn
 
-def fqn_str(fqn: List[str]) -> str:
+    parts.reverse()
+    return parts_fqn(tuple(parts))
+
+def fqn_str(fqn: Sequence[str]) -> str:
+    if isinstance(fqn, FQN): return fqn.name
     return ".".join(fqn)
 
-def str_fqn(varname: str) -> List[str]:
-    return varname.split('.')
+def str_fqn(varname: str) -> FQN:
+    ret = _fqns_by_name.get(varname)
+    if ret is None: ret = parts_fqn(tuple(varname.split('.')))
+    return ret
 
 def called_function_name(node: ast.Call):
     if isinstance(node.func, ast.Name):
         return node.func.id
     if isinstance(node.func, ast.Attribute):
-        return ".".join(attribute_fqn(node.func))
+        return attribute_fqn(node.func).name
     # Don't know what else might come up!
     assert(False)
@@ -0,0 +1,137 @@
+"""Checks the proofs in many proof scripts in a single process, so that parsed classes and canonicalizations are shared
+between them rather than recomputed by a new interpreter for every script.  Used by `python -m gamehop check`."""
+import argparse
+import contextlib
+import io
+import json
+import os
+import runpy
+import sys
+import tempfile
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+from . import utils
+from .proofs2 import Proof
+from .verification import cache as canonicalization_cache
+from .verification.profile import Profile
+
+def proof_scripts(paths: List[str]) -> List[str]:
+    """Returns the Python files named by paths, replacing each directory by the .py files in it and its subdirectories."""
+    ret = list()
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                ret.extend(os.path.join(dirpath, filename) for filename in sorted(filenames) if filename.endswith(".py"))
+        else:
+            ret.append(path)
+    return ret
+
+class ProofRecorder():
+    """While active, replaces Proof.check so that every proof checked is timed and recorded in results, and uses the
+    given cache, number of workers and profile unless the caller chose them."""
+    def __init__(self, cache: Optional[canonicalization_cache.CanonicalizationCache], workers: Optional[int], profile: Optional[Profile] = None):
+        self.cache = cache
+        self.workers = workers
+        self.profile = profile
+        self.script = ""
+        self.results: List[Dict[str, Any]] = list()
+        self.proofs: List[Proof] = list()
+
+    def __enter__(self):
+        self.check = Proof.check
+        recorder = self
+        def recorded_check(proof, *args, **kwargs):
+            return recorder.recorded_check(proof, *args, **kwargs)
+        Proof.check = recorded_check # type: ignore
+        return self
+
+    def __exit__(self, *exc_info):
+        Proof.check = self.check # type: ignore
+
+    def recorded_check(self, proof: Proof, *args, **kwargs) -> bool:
+        kwargs.setdefault('cache', self.cache)
+        kwargs.setdefault('workers', self.workers)
+        kwargs.setdefault('profile', self.profile)
+        start = time.perf_counter()
+        try:
+            result = self.check(proof, *args, **kwargs)
+        finally:
+            self.proofs.append(proof)
+            self.results.append({ 'script': self.script, 'name': None, 'hops': len(proof.proof_steps), 'valid': False, 'seconds': time.perf_counter() - start })
+        self.results[-1]['valid'] = result
+        return result
+
+    def run_script(self, path: str, output: io.TextIOBase) -> Optional[str]:
+        """Runs a proof script, then checks any Proof in its namespace that the script did not check itself.  The output of
+        the script and of the checks goes to output.  Returns the error raised by the script, if any."""
+        self.script = path
+        first = len(self.results)
+        old_argv = sys.argv
+        sys.argv = [ path ]
+        sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+        try:
+            with contextlib.redirect_stdout(output):
+                namespace = runpy.run_path(path, run_name = "__main__")
+                for (name, value) in namespace.items():
+                    if isinstance(value, Proof) and value.proof_checked == "unchecked":
+                        value.check(print_diffs = False)
+        except BaseException as e:
+            if isinstance(e, KeyboardInterrupt): raise
+            traceback.print_exc(file = output)
+            return "".join(traceback.format_exception_only(type(e), e)).strip()
+        finally:
+            sys.path.pop(0)
+            sys.argv = old_argv
+        # name the proofs after the variables holding them
+        names = { id(value): name for (name, value) in namespace.items() if isinstance(value, Proof) }
+        for (result, proof) in zip(self.results[first:], self.proofs[first:]):
+            result['name'] = names.get(id(proof))
+        return None
+
+def check_scripts(paths: List[str], cache: Optional[canonicalization_cache.CanonicalizationCache] = None, workers: Optional[int] = None, output: Optional[io.TextIOBase] = None, profile: Optional[Profile] = None) -> Dict[str, Any]:
+    """Runs the proof scripts in paths (see proof_scripts) in this process and checks all the proofs they contain.
+    Returns a summary that can be serialized as JSON: each proof checked, with the script containing it, the name of the
+    variable holding it, its number of hops, whether it is valid and the time it took to check; the errors raised by
+    scripts; the total time; and the hits and misses of the canonicalization cache and of utils.parse_cache.
+    The checks are recorded in profile, if it is given."""
+    if output is None: output = io.StringIO()
+    parse_hits, parse_misses = utils.parse_cache.hits, utils.parse_cache.misses
+    errors = list()
+    start = time.perf_counter()
+    with ProofRecorder(cache, workers, profile) as recorder:
+        for path in proof_scripts(paths):
+            error = recorder.run_script(path, output)
+            if error is not None: errors.append({ 'script': path, 'error': error })
+    return {
+        'proofs': recorder.results,
+        'errors': errors,
+        'seconds': time.perf_counter() - start,
+        'canonicalization_cache': { 'hits': cache.hits, 'misses': cache.misses } if cache is not None else None,
+        'parse_cache': { 'hits': utils.parse_cache.hits - parse_hits, 'misses': utils.parse_cache.misses - parse_misses },
+    }
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("paths", nargs = "+", metavar = "path", help = "proof scripts, or directories containing them")
+    parser.add_argument("--workers", type = int, default = None, help = "number of processes canonicalizing the games of each proof")
+    parser.add_argument("--cache-dir", default = None, help = "directory of the canonicalization cache (default: $GAMEHOP_CACHE_DIR, or a temporary one)")
+    parser.add_argument("--verbose", action = "store_true", help = "show the output of the proof scripts on stderr")
+    parser.add_argument("--trace", default = None, metavar = "FILE", help = "write a Chrome trace of the checks (see verification.profile.Profile) to FILE")
+
+def main(args: argparse.Namespace) -> int:
+    """Checks the proofs, prints the summary of check_scripts as JSON, and returns 0 if all of them are valid and no
+    script failed, otherwise 1."""
+    output = sys.stderr if args.verbose else io.StringIO()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.cache_dir is not None:
+            cache = canonicalization_cache.CanonicalizationCache(os.path.join(args.cache_dir, "canonical.sqlite"))
+        else:
+            cache = canonicalization_cache.default_cache() or canonicalization_cache.CanonicalizationCache(os.path.join(tmpdir, "canonical.sqlite"))
+        profile = Profile() if args.trace is not None else None
+        summary = check_scripts(args.paths, cache, args.workers, output, profile)
+    if profile is not None: profile.write_chrome_trace(args.trace)
+    print(json.dumps(summary, indent = 2))
+    ok = not summary['errors'] and all(result['valid'] for result in summary['proofs'])
+    return 0 if ok else 1
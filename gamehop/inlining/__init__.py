@@ -1,5 +1,4 @@
 import ast
-import copy
 import inspect
 import types
 from typing import cast, Any, Callable, List, Optional, Tuple, Type, Union
@@ -47,7 +46,7 @@ def inline_argument_into_function(argname: str, val: Union[bool, float, int, str
 
 def helper_make_lines_of_inlined_function(fdef_to_be_inlined: ast.FunctionDef, params: List[ast.expr], prefix: str) -> List[ast.stmt]:
     """Helper function for InlineFunctionCallIntoStatements. Takes a function definition and list of parameters (one for each argument of the function definition) and returns a copy of the body of the function in which (a) all local variables have been prefixed with prefix and (b) all instances of arguments have been replaced with the corresponding parameter."""
-    working_copy = copy.deepcopy(fdef_to_be_inlined)
+    working_copy = utils.copy_ast(fdef_to_be_inlined)
     # prefix all local variables
     local_variables = utils.vars_assigns_to(fdef_to_be_inlined.body)
     mappings = dict()
@@ -371,7 +370,7 @@ def oldinline_reduction_into_game(R: Type[Crypto.Reduction], GameForR: Type[Cryp
     GameForR_copy = utils.get_class_def(GameForR)
     
     # create the shell of the OutputGame
-    OutputGame = copy.deepcopy(GameForR_copy)
+    OutputGame = utils.copy_ast(GameForR_copy)
     if game_name: OutputGame.name = game_name
     else: OutputGame.name = utils.get_class_def(TargetGame).name
     OutputGame.body = []
@@ -481,7 +480,7 @@ def inline_reduction_into_game(R: Type[Crypto.Reduction], GameForR: Type[Crypto.
     GameForR_copy = utils.get_class_def(GameForR)
     
     # create the shell of the OutputGame
-    OutputGame = copy.deepcopy(GameForR_copy)
+    OutputGame = utils.copy_ast(GameForR_copy)
     if game_name: OutputGame.name = game_name
     else: OutputGame.name = utils.get_class_def(TargetGame).name
     OutputGame.body = []
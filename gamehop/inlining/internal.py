@@ -1,5 +1,4 @@
 import ast
-import copy
 import inspect
 import types
 from typing import Any, Callable, List, Optional, Set, Union
@@ -8,7 +7,8 @@ from .. import utils
 
 def find_all_variables(f: Union[Callable, str, ast.FunctionDef]) -> List[str]:
     """Return a set of all variables in the function, including function parameters."""
-    fdef = utils.get_function_def(f)
+    # the function is only read, so a FunctionDef need not be copied
+    fdef = f if isinstance(f, ast.FunctionDef) else utils.get_function_def(f)
     vars = list()
     # function arguments
     args = fdef.args
@@ -38,7 +38,7 @@ def find_all_variables(f: Union[Callable, str, ast.FunctionDef]) -> List[str]:
 
 def dereference_attribute(f: Union[Callable, str, ast.FunctionDef], name: str, formatstr: str) -> str:
     """Returns a string representing a function with all references to 'name.whatever' replaced with formatstr.format(whatever) (e.g., with 'name_whatever').  Only replaces top-level calls (a.b.c -> a_b.c) but not within (w.a.b does not go to w.a_b)."""
-    fdef = copy.deepcopy(utils.get_function_def(f))
+    fdef = utils.get_function_def(f)
     # fortunately a.b.c is parsed as ((a.b).c)
     # and we only want to replace the a.b
     class AttributeDereferencer(ast.NodeTransformer):
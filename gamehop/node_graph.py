@@ -1,13 +1,34 @@
 from . import node_traverser as nt
 from . import bits
 import ast
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from collections import namedtuple
 
 Edge = namedtuple('Edge', 'tail head label')
 
-class Graph():
+class VariableIds():
+    '''Interns variable and attribute names (eg. x or self.k) as small integers, so that sets of them can be stored as int bitsets.'''
     def __init__(self):
+        self.ids: Dict[str, int] = dict()
+        self.names: List[str] = list()
+
+    def id(self, name: str) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def bitset(self, names: Iterable[str]) -> int:
+        ret = 0
+        for name in names: ret |= 1 << self.id(name)
+        return ret
+
+    def names_in(self, bitset: int) -> List[str]:
+        return [ self.names[i] for i in bits.bit_indices(bitset) ]
+
+class Graph():
+    def __init__(self, var_ids: Optional[VariableIds] = None):
 
         self.vertices: List[ast.stmt] = list()
         # An edge goes from the tail to the head, where the tail vertex reads a variable
@@ -15,6 +36,14 @@ class Graph():
         # on each edge is the name of the variable.
         self.edges: List[Edge] = list()
 
+        # Indexes for the above, so that lookups do not have to scan the lists: the position of each vertex,
+        # the set of edges, and the edges into and out of each vertex (in the order they were added).
+        # AST nodes are hashed by identity, just as they are compared.
+        self.vertex_index: Dict[ast.stmt, int] = dict()
+        self.edge_set: Set[Edge] = set()
+        self.in_adjacency: Dict[ast.stmt, List[Edge]] = dict()
+        self.out_adjacency: Dict[ast.stmt, List[Edge]] = dict()
+
 
         # This dictionary holds graphs corresponding to bodies of nodes
         # each value is a dictionar mapping node field names (eg. body, orelse) to inner graphs
@@ -23,22 +52,81 @@ class Graph():
         # For this graph, its values are loaded in the outer graph.  This will be put into order of loads during canonical ordering
         self.values_loaded: List[str] = list()
 
+        # Bitset mode (see GraphMaker), if var_ids is given to intern the variable names.  Each vertex also gets a number
+        # that does not change when the vertices are reordered, so that sets of variables and of vertices are int bitsets:
+        # the variables each vertex loads and stores (reads and writes, filled in by GraphMaker), the vertices with an edge
+        # into a vertex for a variable (loaders, keyed by the vertex and the id of the variable) and the heads of the edges
+        # out of each vertex (successors, and successors_without_overwrites ignoring overwrite edges).  The heads are also
+        # kept in lists, in the order out_neighbours returns them.
+        self.var_ids = var_ids
+        self.vertex_numbers: Dict[ast.stmt, int] = dict()
+        self.numbered_vertices: List[ast.stmt] = list()
+        self.reads: Dict[ast.stmt, int] = dict()
+        self.writes: Dict[ast.stmt, int] = dict()
+        self.loaders: Dict[Tuple[ast.stmt, int], int] = dict()
+        self.successors: Dict[ast.stmt, int] = dict()
+        self.successors_without_overwrites: Dict[ast.stmt, int] = dict()
+        self.successor_lists: Dict[ast.stmt, List[ast.stmt]] = dict()
+        self.successor_lists_without_overwrites: Dict[ast.stmt, List[ast.stmt]] = dict()
+
     @staticmethod
-    def from_stmts(stmts: List[ast.stmt], extra_dependencies: Dict[str, List[str]] = {}):
+    def from_stmts(stmts: List[ast.stmt], extra_dependencies: Dict[str, List[str]] = {}, bitsets: bool = False):
         '''Create a node graph from a list of statements.  Creates edges based on the relationship
         between nodes that store variables and those that load them.  Recurses to create inner
-        graphs on any statements that have bodies (eg. if body).  For now, does not do anything with function or class bodies.'''
-        g_maker = GraphMaker(extra_dependencies)
+        graphs on any statements that have bodies (eg. if body).  For now, does not do anything with function or class bodies.
+        If bitsets is True, the graph is made in bitset mode (see GraphMaker).'''
+        g_maker = GraphMaker(extra_dependencies, bitsets)
         g_maker.visit_statements(stmts)
         return g_maker.graphs[0]
 
     def add_vertex(self, a: ast.stmt):
+        self.vertex_index[a] = len(self.vertices)
         self.vertices.append(a)
-
-    def _add_Edge(self, e: Edge):
-        assert(e.head in self.vertices)
-        assert(e.tail in self.vertices)
-        bits.append_if_unique(self.edges, e)
+        self.in_adjacency[a] = list()
+        self.out_adjacency[a] = list()
+        if self.var_ids is not None:
+            self.vertex_numbers[a] = len(self.numbered_vertices)
+            self.numbered_vertices.append(a)
+            self.successors[a] = 0
+            self.successors_without_overwrites[a] = 0
+            self.successor_lists[a] = list()
+            self.successor_lists_without_overwrites[a] = list()
+
+    def vertex_bit(self, a: ast.stmt) -> int:
+        return 1 << self.vertex_numbers[a]
+
+    def vertices_in(self, bitset: int) -> List[ast.stmt]:
+        '''Returns the vertices in a bitset of vertex numbers, in the order they were added.'''
+        return [ self.numbered_vertices[i] for i in bits.bit_indices(bitset) ]
+
+    def has_vertex(self, a: ast.stmt) -> bool:
+        return a in self.vertex_index
+
+    def set_vertex_order(self, vertices: List[ast.stmt]) -> None:
+        '''Replace the list of vertices by a reordering of it.'''
+        self.vertices = vertices
+        self.vertex_index = { v: i for i, v in enumerate(vertices) }
+
+    def _add_Edge(self, e: Edge, overwrite: Optional[bool] = None):
+        assert(e.head in self.vertex_index)
+        assert(e.tail in self.vertex_index)
+        if e in self.edge_set: return
+        self.edge_set.add(e)
+        self.edges.append(e)
+        self.in_adjacency[e.head].append(e)
+        self.out_adjacency[e.tail].append(e)
+        if self.var_ids is not None:
+            if overwrite is None: overwrite = e.label.endswith(':overwrite')
+            head_bit = self.vertex_bit(e.head)
+            if not self.successors[e.tail] & head_bit:
+                self.successors[e.tail] |= head_bit
+                self.successor_lists[e.tail].append(e.head)
+            if not overwrite:
+                if not self.successors_without_overwrites[e.tail] & head_bit:
+                    self.successors_without_overwrites[e.tail] |= head_bit
+                    self.successor_lists_without_overwrites[e.tail].append(e.head)
+                key = (e.head, self.var_ids.id(e.label))
+                self.loaders[key] = self.loaders.get(key, 0) | self.vertex_bit(e.tail)
 
     def add_edge(self, tail:ast.stmt, head: ast.stmt, var: str) -> None:
         '''Create an edge from vertex s to vertex d for variable var.  The edge indicates a dependency, i.e. vertex s depends
@@ -46,26 +134,39 @@ class Graph():
         '''
         self._add_Edge(Edge(tail, head, var))
 
+    def add_var_edge(self, tail: ast.stmt, head: ast.stmt, var: str, overwrite: bool) -> None:
+        '''Same as add_edge, for an edge labelled var, or var:overwrite if tail overwrites the value of var assigned by head
+        (or that head loaded).'''
+        self._add_Edge(Edge(tail, head, var + ':overwrite' if overwrite else var), overwrite)
+
+    def loaders_of(self, head: ast.stmt, var: str) -> List[ast.stmt]:
+        '''Returns the vertices with an edge into head for var, in the order they were added.  Bitset mode only.'''
+        assert self.var_ids is not None
+        return self.vertices_in(self.loaders.get((head, self.var_ids.id(var)), 0))
+
     def induced_subgraph(self, newvertices: List[ast.stmt]) -> 'Graph':
         '''Return a new graph which has newvertices as its vertices.  Edges are kept that go
         between vertices in newvertices'''
-        G = Graph()
+        G = Graph(self.var_ids)
 
         for v in newvertices:
             G.add_vertex(v)
             if v in G.inner_graphs:
                 G.inner_graphs[v] = self.inner_graphs[v]
+            if v in self.reads:
+                G.reads[v] = self.reads[v]
+                G.writes[v] = self.writes[v]
 
         for e in self.edges:
-            if e.head in G.vertices and e.tail in G.vertices:
+            if e.head in G.vertex_index and e.tail in G.vertex_index:
                     G._add_Edge(e)
         return G
 
     def in_edges(self, v: ast.stmt) -> List[Edge]: 
-        return [ e for e in self.edges if e.head == v ]
+        return list(self.in_adjacency.get(v, []))
 
     def out_edges(self, v: ast.stmt) -> List[Edge]: 
-        return [ e for e in self.edges if e.tail == v ]
+        return list(self.out_adjacency.get(v, []))
 
     def in_edge_labels(self, v: ast.stmt) -> List[str]:
         return bits.unique_elements([ e.label for e in self.in_edges(v) ])
@@ -73,12 +174,14 @@ class Graph():
     def in_neighbours(self, v):
         ''' For a give vertex v, return the statements u such that v assigned/modified 
         a variable that u depends on.  I.e. u -> v is an edge.'''
-        return bits.unique_elements( [ e.tail for e in self.edges if e.head == v ] )
+        return list(dict.fromkeys( e.tail for e in self.in_adjacency.get(v, []) ))
 
     def out_neighbours(self, v: ast.stmt, omit_overwrites=False) -> List[ast.stmt]:
         ''' For a give vertex v, return the statements u such that u assigned/modified 
         a variable that v depends on.  I.e. v -> u is an edge'''
-        return bits.unique_elements([ e.head for e in self.edges if e.tail == v and not (omit_overwrites and e.label.endswith(':overwrite')) ])
+        if self.var_ids is not None:
+            return list((self.successor_lists_without_overwrites if omit_overwrites else self.successor_lists).get(v, []))
+        return list(dict.fromkeys( e.head for e in self.out_adjacency.get(v, []) if not (omit_overwrites and e.label.endswith(':overwrite')) ))
 
     def var_refs(self, start = None):
         '''Returns variable names in order referenced/loaded by vertices, starting from a particular vertex (if supplied).  Note that
@@ -86,29 +189,37 @@ class Graph():
         reversed the order starts with the last statement (eg return) in order that it references the variables (left to right)'''
 
         # We assume that edges are added in order that the corresponding variables are referenced.
-        i = self.vertices.index(start) if start is not None else 0
+        i = self.vertex_index[start] if start is not None else 0
         for v in self.vertices[i:]:
             for e in reversed(self.out_edges(v)):
                 yield e.label
 
     def max_vertices(self) -> List[ast.stmt]:
         ''' Returns a list of vertices such that they have no in-edges, i.e. no other vertex depends on them.'''
-        return [ v for v in self.vertices if self.in_edges(v) == [] ]
+        return [ v for v in self.vertices if not self.in_adjacency[v] ]
 
     def depth_first_traverse(self, start_points, omit_overwrites=False):
-        yield from self.depth_first_traverse_R(start_points, list(), omit_overwrites)
-
-    def depth_first_traverse_R(self, start_points, visited, omit_overwrites):
+        '''Yields the vertices reachable from start_points in depth first order.  This uses an explicit stack
+        of neighbour iterators rather than recursion, so that long dependency chains cannot hit the recursion limit.'''
+        visited = set()
         for v in start_points:
-            if v not in visited:
-                visited.append(v)
-                yield v
-                # Visit the neighbours in reversed order.  We are visiting the entire graph
-                # somehow backwards (from start_points back to vertices they depend on) and
-                # we want that if we reverse that we would have the first neighbours referenced
-                # to come first
-                for n in reversed(self.out_neighbours(v, omit_overwrites)):
-                    yield from self.depth_first_traverse_R([n], visited, omit_overwrites)
+            if v in visited: continue
+            visited.add(v)
+            yield v
+            # Visit the neighbours in reversed order.  We are visiting the entire graph
+            # somehow backwards (from start_points back to vertices they depend on) and
+            # we want that if we reverse that we would have the first neighbours referenced
+            # to come first
+            stack = [ reversed(self.out_neighbours(v, omit_overwrites)) ]
+            while stack:
+                for n in stack[-1]:
+                    if n not in visited:
+                        visited.add(n)
+                        yield n
+                        stack.append(reversed(self.out_neighbours(n, omit_overwrites)))
+                        break
+                else:
+                    stack.pop()
 
     def reachable_subgraph(self, start_points, omit_overwrites=False):
         '''Returns a new graph which is the induced subgraph of the current graph on the set of vertices
@@ -120,14 +231,44 @@ class Graph():
 
         return self.induced_subgraph(new_vertices)
 
+    def restrict_to_reachable(self, start_points, omit_overwrites=False) -> None:
+        '''Removes, in place, the vertices that are not reachable from vertices in start_points and puts the others in depth
+        first order.  This gives the same graph as reachable_subgraph(start_points, omit_overwrites), without copying the
+        vertices and edges that are kept.  As with reachable_subgraph, inner graphs are not kept, so canonical_sort leaves
+        the bodies of the remaining statements as they are.'''
+        self.set_vertex_order([ v for v in self.depth_first_traverse(start_points, omit_overwrites) ])
+        kept = self.vertex_index
+        self.edges = [ e for e in self.edges if e.head in kept and e.tail in kept ]
+        self.edge_set = set(self.edges)
+        self.in_adjacency = { v: [ e for e in self.in_adjacency[v] if e.tail in kept ] for v in self.vertices }
+        self.out_adjacency = { v: [ e for e in self.out_adjacency[v] if e.head in kept ] for v in self.vertices }
+        self.inner_graphs = dict()
+        if self.var_ids is not None:
+            kept_bits = 0
+            for v in self.vertices: kept_bits |= self.vertex_bit(v)
+            self.reads = { v: self.reads[v] for v in self.vertices if v in self.reads }
+            self.writes = { v: self.writes[v] for v in self.vertices if v in self.writes }
+            self.loaders = { key: tails & kept_bits for (key, tails) in self.loaders.items() if key[0] in kept and tails & kept_bits }
+            self.successors = { v: self.successors[v] & kept_bits for v in self.vertices }
+            self.successors_without_overwrites = { v: self.successors_without_overwrites[v] & kept_bits for v in self.vertices }
+            self.successor_lists = { v: [ u for u in self.successor_lists[v] if u in kept ] for v in self.vertices }
+            self.successor_lists_without_overwrites = { v: [ u for u in self.successor_lists_without_overwrites[v] if u in kept ] for v in self.vertices }
+
     def topological_order_traverse(self):
         '''Returns the vertices in a topological ordering, starting from vertices that have no in-edges, i.e. they do not provide
-        any values loaded by other statements'''
-        max_vertices = self.max_vertices()
-        if max_vertices:
-            yield from max_vertices
-            vertices_remaining = [ v for v in self.vertices if v not in max_vertices ]
-            yield from self.induced_subgraph(vertices_remaining).topological_order_traverse()
+        any values loaded by other statements.  This goes in layers: first all vertices with no in-edges, then all vertices
+        with no in-edges once those are removed, etc.  Within a layer vertices are in the order of self.vertices.'''
+        # count the in-edges from vertices that have not been output yet
+        in_degree = { v: len(self.in_adjacency[v]) for v in self.vertices }
+        layer = [ v for v in self.vertices if in_degree[v] == 0 ]
+        while layer:
+            yield from layer
+            next_layer = list()
+            for v in layer:
+                for e in self.out_adjacency[v]:
+                    in_degree[e.head] -= 1
+                    if in_degree[e.head] == 0: next_layer.append(e.head)
+            layer = sorted(next_layer, key = lambda v: self.vertex_index[v])
 
     def canonical_sort(self):
         '''Sort the vertices in place according to a canonical ordering based on relationship between values stored and values loaded.
@@ -154,13 +295,14 @@ class Graph():
                     break
 
         # we don't want to lose vertices if their variables were never referenced
+        dfs_start_vertices_set = set(dfs_start_vertices)
         for v in top_vertices:
-            if v not in dfs_start_vertices:
+            if v not in dfs_start_vertices_set:
                 dfs_start_vertices.append(v)
 
         vertices_dfs = [ v for v in self.depth_first_traverse(dfs_start_vertices) ]
         assert(len(self.vertices) == len(vertices_dfs))
-        self.vertices = vertices_dfs
+        self.set_vertex_order(vertices_dfs)
 
         # Step 2: Reorder vertices by Khan's algorithm
         # Khan's algorithm will not give a single possible ordering.  Where there are multiple possible orders, this code
@@ -170,7 +312,7 @@ class Graph():
         # we reorder based on the out edges.  Out edges point towards where a value was assigned, i.e. backwards up the list of statements.
         # here we put them in forwards order
         vertices_in_order.reverse()
-        self.vertices = vertices_in_order
+        self.set_vertex_order(vertices_in_order)
 
         # Between the DFS and Khan's algorithm we get a canonical ordering based only on the order that values are referenced
         # within a statement, and the relationship between statements that reference each other's values
@@ -206,9 +348,20 @@ class Graph():
                 bodygraph.print()
 
 class GraphMaker(nt.NodeTraverser):
-    def __init__(self, extra_dependencies: Dict[str, List[str]] = {}):
+    '''Makes the graph of a list of statements, see Graph.from_stmts.
+
+    In bitset mode (if bitsets is True), the variable names are interned by a VariableIds shared by the graph and its
+    inner graphs, the variables loaded and stored by each statement are recorded as bitsets, and the edges from a
+    statement overwriting a variable to those that loaded it are found from the bitsets of loaders rather than by
+    comparing the labels of the edges into the previous assigner.  Neighbours are then looked up in lists kept as
+    the edges are added, instead of filtering the edges on their labels.  The graph is otherwise the same as without
+    bitsets (the same vertices and edges, in the same order), so the two modes can be compared.'''
+    tracks_stmt_scopes = True
+
+    def __init__(self, extra_dependencies: Dict[str, List[str]] = {}, bitsets: bool = False):
+        self.var_ids = VariableIds() if bitsets else None
         # We keep a stack of graphs to store inner graphs as we create them
-        self.graphs = [ Graph() ]
+        self.graphs = [ Graph(self.var_ids) ]
         self.extra_dependencies = extra_dependencies
         super().__init__()
 
@@ -244,8 +397,8 @@ class GraphMaker(nt.NodeTraverser):
                     continue
                 # if this is an inner graph, then the modifier may not
                 # be in this graph.
-                if modifier_stmt in self.graphs[-1].vertices:
-                    self.graphs[-1].add_edge(stmt, modifier_stmt, var)
+                if self.graphs[-1].has_vertex(modifier_stmt):
+                    self.graphs[-1].add_var_edge(stmt, modifier_stmt, var, False)
                 else:
                     # Modifier was not in this block, so add this
                     # as an external variable to the parent statement to create an edge
@@ -258,27 +411,34 @@ class GraphMaker(nt.NodeTraverser):
         # that are in the same scope.  If this is an inner scope, eg
         # FunctionDef then the overwritten variable reverts back
         # to the original value once we leave that scope.
-        for var in stmt_scope.unique_vars_and_attributes_stored():
-            var_name = var + ':overwrite'
+        stored = stmt_scope.unique_vars_and_attributes_stored()
+        for var in stored:
             for old_assigner in old_scope.var_modifiers(var):
                 # the old assigner might not be in this graph, eg. if this is an inner graph
                 # In that case it should be handled by the parent statement.
-                if old_assigner in self.graphs[-1].vertices:
-                    self.graphs[-1].add_edge(stmt, old_assigner, var_name)
+                if self.graphs[-1].has_vertex(old_assigner):
+                    self.graphs[-1].add_var_edge(stmt, old_assigner, var, True)
 
                     # we also need to add edges to any statement that previously
                     # loaded this variable since they need to come before this
                     # statement in order to have the correct value
-                    for e in self.graphs[-1].in_edges(old_assigner):
-                        if e.label == var and e.tail is not stmt:
-                               self.graphs[-1].add_edge(stmt, e.tail, var_name)
+                    if self.var_ids is not None:
+                        loaders = [ tail for tail in self.graphs[-1].loaders_of(old_assigner, var) if tail is not stmt ]
+                    else:
+                        loaders = [ e.tail for e in self.graphs[-1].in_edges(old_assigner) if e.label == var and e.tail is not stmt ]
+                    for tail in loaders:
+                        self.graphs[-1].add_var_edge(stmt, tail, var, True)
+
+        if self.var_ids is not None:
+            self.graphs[-1].reads[stmt] = self.var_ids.bitset(stmt_scope.external_vars)
+            self.graphs[-1].writes[stmt] = self.var_ids.bitset(stored)
 
         return ret
 
 
     def visit_body(self, body, body_name):
         # Push a new graph for the body
-        self.graphs.append(Graph())
+        self.graphs.append(Graph(self.var_ids))
 
         # Visit the body
         new_body = self.visit_stmts(body)
@@ -306,7 +466,7 @@ class GraphMaker(nt.NodeTraverser):
 
     def visit_FunctionDef(self, node):
          # Push a new graph for the orelse
-        self.graphs.append(Graph())
+        self.graphs.append(Graph(self.var_ids))
 
         # Visit the orelse
         self.visit_stmts(node.body)
@@ -2,7 +2,7 @@ from __future__ import annotations
 # The above is used to allow references to a class within a class definition, so
 # that we can return an instance of a class, eg. from a constructor
 
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 import ast
 import re
 
@@ -10,21 +10,66 @@ from . import bits
 from . import scope
 
 
+# The fields of each node type, in the order ast gives them, filled in as types are met.  Types that are not AST nodes
+# (str, int, None, ...) have no fields.
+_fields_by_type: Dict[type, Tuple[str, ...]] = dict()
+
+def _node_fields(t: type) -> Tuple[str, ...]:
+    ret = _fields_by_type.get(t)
+    if ret is None:
+        ret = tuple(getattr(t, '_fields', ()))
+        _fields_by_type[t] = ret
+    return ret
+
+def _children(n, fields: Tuple[str, ...]) -> list:
+    ''' The children of node n, whose fields are fields, in reverse order, ready to be pushed on a stack. '''
+    ret = list()
+    for field_name in reversed(fields):
+        field = getattr(n, field_name, None)
+        if isinstance(field, list): ret.extend(reversed(field))
+        elif field is not None: ret.append(field)
+    return ret
+
 # type checking is difficult for this one.  mypy doesn't understand that
 # we filter on nodetype, which causes problems downstream
-def nodes(node, nodetype = ast.AST):
-    ''' Generate nodes by depth first traversal of an AST or
-    a list of ASTs.  Optionally, filter by node type.'''
-    if isinstance(node, list):
-        for i in node:
-            yield from nodes(i, nodetype)
-    else:
-        if isinstance(node, nodetype): yield node
-        if hasattr(node, '_fields'):
-            for field_name in getattr(node, '_fields'):
-                if not hasattr(node, field_name): continue
-                field = getattr(node, field_name)
-                yield from nodes(field, nodetype)
+def nodes(node, nodetype = ast.AST, prune = ()) -> list:
+    ''' Returns the nodes of an AST or a list of ASTs, in the order of a depth
+    first traversal.  Optionally, filter by node type, and do not descend into
+    (but still include) nodes of the types in prune.  Walks with an explicit
+    stack rather than recursion.'''
+    ret: list = list()
+    stack = [ node ]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, list):
+            stack.extend(reversed(n))
+            continue
+        if isinstance(n, nodetype): ret.append(n)
+        fields = _fields_by_type.get(type(n))
+        if fields is None: fields = _node_fields(type(n))
+        if fields and not isinstance(n, prune): stack.extend(_children(n, fields))
+    return ret
+
+def nodes_by_type(node, nodetypes: Sequence[type], prune = ()) -> List[list]:
+    ''' Like nodes, but collects the nodes of each of several types in a single
+    traversal.  Returns one list for each type in nodetypes, in the same order.
+    A node of more than one of the types is in each of their lists.'''
+    ret: List[list] = [ list() for _ in nodetypes ]
+    pairs = list(zip(nodetypes, ret))
+    any_type = tuple(nodetypes)
+    stack = [ node ]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, list):
+            stack.extend(reversed(n))
+            continue
+        if isinstance(n, any_type):
+            for (t, l) in pairs:
+                if isinstance(n, t): l.append(n)
+        fields = _fields_by_type.get(type(n))
+        if fields is None: fields = _node_fields(type(n))
+        if fields and not isinstance(n, prune): stack.extend(_children(n, fields))
+    return ret
 
 defaultPurity = {
     '__regexp__': {  #  Match by regular expression (including for normal functions).  First match used.
@@ -65,8 +110,14 @@ class NodeTraverser():
         of all variables it defines
     - keeping track of the parent of nodes as they are processed, available through
         parent(), which returns None if there is no parent, eg. if this a top-level node
+    - keeping track of the variables loaded and stored by the statement being visited, available through
+        local_stmt_scope(), if the subclass sets tracks_stmt_scopes to True.
     - if you need a new variable name, unique_variable_name() will give you one.
         each call returns a new name.
+    - keeping track of whether the tree was changed, available through the changed attribute.
+        visit() sets it whenever a node is replaced by a different object (or a list, or None).
+        Subclasses that modify nodes in place must set it themselves, as ArgumentReorderer does;
+        the other canonicalization traversers only ever return new nodes.
 
     Thinks to keep in mind:
     - if you define any of these functions then you must deal with the scopes etc. yourself
@@ -87,6 +138,21 @@ class NodeTraverser():
     - Get this functionality into the NodeVisitor somehow.  Nothing here changes any
      nodes, so it shouldn't be too bad.
      """
+    # Handlers called by visit_internal() and call_subclass_visitor() for each type of node, so that
+    # they are not looked up by name on every visit.  Each subclass gets its own tables, which are filled
+    # in the first time a node of each type is visited.
+    _internal_visitors: Dict[type, Callable] = dict()
+    _subclass_visitors: Dict[type, Callable] = dict()
+
+    # Whether to keep track of the variables loaded and stored by each statement (see stmt_scopes).  This
+    # costs a Scope per statement visited, so it is only done for subclasses that use local_stmt_scope().
+    tracks_stmt_scopes: bool = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._internal_visitors = dict()
+        cls._subclass_visitors = dict()
+
     def __init__(self, counter=0, var_format = '_var_{:d}', type_method_purity = None ):
         ''' counter sets the starting value for unique_variable_name() calls.
         var_format gives the string format for unique_variable_name() calls.
@@ -112,12 +178,15 @@ class NodeTraverser():
         self.block_scopes: List[scope.Scope] = [ scope.Scope(self.type_method_purity) ]
 
         # Statement level scopes are used to keep track of variables that are stored/loaded within
-        # a single statement and its children
-        self.stmt_scopes: List[scope.Scope] = [ scope.Scope(self.type_method_purity) ]
+        # a single statement and its children.  Only used if tracks_stmt_scopes is set.
+        self.stmt_scopes: List[scope.Scope] = [ scope.Scope(self.type_method_purity) ] if self.tracks_stmt_scopes else list()
 
         # Keep track of the parent of the node being transformed
         self.ancestors: List[ast.ast] = list()
 
+        # Set to True when any visit replaces a node, see visit()
+        self.changed: bool = False
+
 
 
     def unique_variable_name(self):
@@ -164,6 +233,7 @@ class NodeTraverser():
         return self.scopes[-1]
 
     def local_stmt_scope(self):
+        assert self.tracks_stmt_scopes, f"{type(self).__name__} must set tracks_stmt_scopes to use statement scopes"
         return self.stmt_scopes[-1]
 
     def new_block_scope(self) -> None:
@@ -214,7 +284,7 @@ class NodeTraverser():
 
         # For statement we don't want to search up the stack of scopes since
         # these will not capture all variable assigns
-        self.local_stmt_scope().add_method_call(varname, caller)
+        if self.tracks_stmt_scopes: self.local_stmt_scope().add_method_call(varname, caller)
 
 
     def add_var_load(self, varname, load_type = None):
@@ -231,7 +301,7 @@ class NodeTraverser():
 
         # For statement we don't want to search up the stack of scopes since
         # these will not capture all variable assigns
-        self.local_stmt_scope().add_var_load(varname, load_type)
+        if self.tracks_stmt_scopes: self.local_stmt_scope().add_var_load(varname, load_type)
 
     def add_var_store(self, varname: str, stmt: ast.stmt) -> None:
         ''' Record a ast.Store event on a Name or Attribute.  This is called instead of add_var_assignment
@@ -240,18 +310,18 @@ class NodeTraverser():
         '''
         self.local_scope().add_var_store(varname, stmt)
         self.block_scopes[-1].add_var_store(varname, stmt)
-        self.stmt_scopes[-1].add_var_store(varname, stmt)        
+        if self.tracks_stmt_scopes: self.stmt_scopes[-1].add_var_store(varname, stmt)
 
     def add_var_assignment(self, varname: str, stmt: ast.stmt, value: Optional[ast.expr]) -> None:
         ''' Add a variable name to scope, storing the associated value expression
         '''
         self.local_scope().add_var_assignment(varname, stmt, value)
         self.block_scopes[-1].add_var_assignment(varname, stmt, value)
-        self.stmt_scopes[-1].add_var_assignment(varname, stmt, value)
+        if self.tracks_stmt_scopes: self.stmt_scopes[-1].add_var_assignment(varname, stmt, value)
 
 
     def add_attribute_store_to_scope(self, attribute:ast.Attribute, stmt: ast.stmt, value: Optional[ast.expr]):
-            varname = bits.fqn_str(bits.attribute_fqn(attribute))
+            varname = bits.attribute_fqn(attribute).name
             self.add_var_assignment(varname, stmt, value)
 
     def add_target_to_scope(self, target, s: ast.stmt, value: Optional[ast.expr]):
@@ -526,7 +596,7 @@ class NodeTraverser():
 
             # if this is a method call, like a.blarg()
             if isinstance(self.parent(), ast.Call) and node is self.parent().func:
-                self.local_scope().add_method_call(bits.fqn_str(bits.attribute_fqn(node)), self.parent_statement()) 
+                self.local_scope().add_method_call(bits.attribute_fqn(node).name, self.parent_statement())
                 return node
 
             # if this is in an ast.Attribute, then this value isn't being loaded, but an attribute of it is.
@@ -534,7 +604,7 @@ class NodeTraverser():
             if isinstance(self.parent(), ast.Attribute):
                 return node
 
-            varname = ".".join(bits.attribute_fqn(node))
+            varname = bits.attribute_fqn(node).name
             self.add_var_load(varname, self.parent_statement())
 
         return node
@@ -599,7 +669,7 @@ class NodeTraverser():
                 if isinstance(arg, ast.Name):
                     self.add_var_store(arg.id, self.parent_statement())
                 if isinstance(arg, ast.Attribute):
-                    fqn = bits.fqn_str(bits.attribute_fqn(arg))
+                    fqn = bits.attribute_fqn(arg).name
                     self.add_var_store(fqn, self.parent_statement())
         return node
 
@@ -700,39 +770,45 @@ class NodeTraverser():
 
         '''
         if isinstance(node, ast.stmt):
-            self.stmt_scopes.append(scope.Scope(self.type_method_purity))
-            ret = self.visit_stmt(node)
-            self.stmt_scopes.pop()
-            return ret
-
+            if self.tracks_stmt_scopes:
+                self.stmt_scopes.append(scope.Scope(self.type_method_purity))
+                ret = self.visit_stmt(node)
+                self.stmt_scopes.pop()
+            else:
+                ret = self.visit_stmt(node)
         elif isinstance(node, ast.expr):
-            return self.visit_expr(node)
+            ret = self.visit_expr(node)
         else:
-            return self.call_subclass_visitor(node)
+            ret = self.call_subclass_visitor(node)
+
+        # visitors return the node itself unless they replaced it
+        if ret is not node:
+            self.changed = True
+        return ret
 
     def visit_internal(self, node: ast.AST):
         '''Calls _visit_NodeType where NodeType is the name of the type of
         the node passed in.  If this function is not present then instead
         call_subclass_visitor() is called.
         '''
-        visit_function_name = f"_visit_{type(node).__name__}"
-        if hasattr(self, visit_function_name):
-            visit_function = getattr(self, visit_function_name)
-            return visit_function(node)
-        else:
-            return self.call_subclass_visitor(node)
+        cls = type(self)
+        visit_function = cls._internal_visitors.get(type(node))
+        if visit_function is None:
+            visit_function = getattr(cls, f"_visit_{type(node).__name__}", cls.call_subclass_visitor)
+            cls._internal_visitors[type(node)] = visit_function
+        return visit_function(self, node)
 
     def call_subclass_visitor(self, node: ast.AST):
         '''Calls visit_NodeType where NodeType is the name of the type of
         the node passed in.  If this function is not present then instead
         generic_visit() is called.
         '''
-        visit_function_name = f"visit_{type(node).__name__}"
-        if hasattr(self, visit_function_name):
-            visit_function = getattr(self, visit_function_name)
-            return visit_function(node)
-        else:
-            return self.generic_visit(node)
+        cls = type(self)
+        visit_function = cls._subclass_visitors.get(type(node))
+        if visit_function is None:
+            visit_function = getattr(cls, f"visit_{type(node).__name__}", cls.generic_visit)
+            cls._subclass_visitors[type(node)] = visit_function
+        return visit_function(self, node)
 
     def generic_visit(self, node):
         ''' Visit all children of a current node.  This will not call any
@@ -1,12 +1,16 @@
 import ast
 import copy
 import jinja2
-from typing import cast, Dict, List, Optional, Type
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import cast, Dict, Iterator, List, NamedTuple, Optional, Tuple, Type
 
 from .primitives import Crypto
 from . import inlining
 from .inlining import internal
 from . import verification
+from .verification import cache as canonicalization_cache
+from .verification.profile import Profile, profiled
 from . import utils
 from .format import textify
 
@@ -34,8 +38,47 @@ class DistinguishingProofStep(ProofStep):
         return self.experiment.get_left() if self.reverse_direction else self.experiment.get_right()
     def get_right_src(self):
         return inlining.inline_reduction_into_game(self.reduction, self.get_right_game(), self.scheme, self.schemeName, self.target_experiment.get_target_game(), self.target_scheme, self.target_experiment.get_adversary(), game_name = "G")
+    def reduction_name(self) -> str:
+        return utils.fqn(self.reduction)
     def advantage(self):
-        return f"Advantage of reduction {utils.fqn(self.reduction)} in experiment {self.experiment.get_primitive_name()}.{self.experiment.get_experiment_name()} for {utils.typefqn(self.scheme)} scheme {self.schemeName}"
+        return f"Advantage of reduction {self.reduction_name()} in experiment {self.experiment.get_primitive_name()}.{self.experiment.get_experiment_name()} for {utils.typefqn(self.scheme)} scheme {self.schemeName}"
+
+class HybridArgument():
+    """The reduction family shared by the hops of a hybrid argument (see Proof.add_hybrid_proof_step).  The reduction
+    is inlined into each side of the experiment only once, with its index left as a free variable; the games of each hop
+    are copies of these with the index bound to a constant."""
+    def __init__(self, reduction: Type[Crypto.Reduction], index_name: str, n: int, experiment: Crypto.DistinguishingExperiment, scheme: Type[Crypto.Scheme], schemeName: str, reverse_direction: bool, target_experiment: Crypto.Experiment, target_scheme: Type[Crypto.Scheme]):
+        self.reduction = reduction
+        self.index_name = index_name
+        self.n = n
+        self.experiment = experiment
+        self.scheme = scheme
+        self.schemeName = schemeName
+        self.reverse_direction = reverse_direction
+        self.target_experiment = target_experiment
+        self.target_scheme = target_scheme
+        self.inlined: Dict[Type[Crypto.Game], ast.ClassDef] = dict()
+    def get_src(self, game: Type[Crypto.Game], index: int) -> str:
+        """Returns the reduction with its index bound to index inlined into game, one of the sides of the experiment."""
+        if game not in self.inlined:
+            self.inlined[game] = utils.get_class_def(inlining.inline_reduction_into_game(self.reduction, game, self.scheme, self.schemeName, self.target_experiment.get_target_game(), self.target_scheme, self.target_experiment.get_adversary(), game_name = "G"))
+        game_def = utils.NameNodeReplacer({ self.index_name: ast.Constant(index) }).visit(utils.copy_ast(self.inlined[game]))
+        return ast.unparse(game_def)
+    def advantage(self):
+        return f"{self.n} × Advantage of reduction {utils.fqn(self.reduction)} with {self.index_name} uniformly random in 0, ..., {self.n - 1} in experiment {self.experiment.get_primitive_name()}.{self.experiment.get_experiment_name()} for {utils.typefqn(self.scheme)} scheme {self.schemeName}"
+
+class HybridProofStep(DistinguishingProofStep):
+    """The hop of a hybrid argument using the reduction with its index bound to index."""
+    def __init__(self, hybrid: HybridArgument, index: int):
+        super().__init__(hybrid.reduction, hybrid.experiment, hybrid.scheme, hybrid.schemeName, hybrid.reverse_direction, hybrid.target_experiment, hybrid.target_scheme)
+        self.hybrid = hybrid
+        self.index = index
+    def get_left_src(self):
+        return self.hybrid.get_src(self.get_left_game(), self.index)
+    def get_right_src(self):
+        return self.hybrid.get_src(self.get_right_game(), self.index)
+    def reduction_name(self) -> str:
+        return f"{utils.fqn(self.reduction)} with {self.hybrid.index_name} = {self.index}"
 
 class RewritingStep(ProofStep):
     def __init__(self, rewrite_left: Type[Crypto.Game], rewrite_right: Type[Crypto.Game]):
@@ -47,18 +90,65 @@ class RewritingStep(ProofStep):
     def get_right_src(self): return ast.unparse(utils.get_class_def(self.rewrite_right))
     def advantage(self): return "0 (Rewriting step)"
 
+def _canonicalize(game_src: str, cache: Optional[canonicalization_cache.CanonicalizationCache] = None, profile: Optional[Profile] = None) -> Tuple[verification.CanonicalForm, int, int]:
+    """Returns the canonicalization of the inlined game game_src, looking it up in and storing it to cache if one
+    is given, together with the number of cache hits and misses this caused.
+    This is a module-level function taking only strings so that it can be run in worker processes by Proof.check
+    without pickling the proof, whichever multiprocessing start method is used."""
+    if cache is None: return (verification.canonical_game(game_src, profile = profile), 0, 0)
+    (hits, misses) = (cache.hits, cache.misses)
+    canonical = cache.canonical_game(game_src, profile = profile)
+    return (canonical, cache.hits - hits, cache.misses - misses)
+
+class HopResult(NamedTuple):
+    """The result of checking game gamenum of a proof, yielded by Proof.hops: the game after the hop into it (left)
+    and before the hop out of it (right), each with its description, its inlined source and its canonicalization; and
+    seconds, the time taken to inline and canonicalize both (when canonicalizing in worker processes, the time spent
+    waiting for them).  The hop is valid if the canonicalizations are equal."""
+    gamenum: int
+    left_description: str
+    left_src: str
+    left: verification.CanonicalForm
+    right_description: str
+    right_src: str
+    right: verification.CanonicalForm
+    seconds: float
+
+    @property
+    def valid(self) -> bool:
+        return self.left.fingerprint == self.right.fingerprint
+
+    def diff(self) -> str:
+        """Returns the diff of the canonicalizations (see utils.string_diff)."""
+        return utils.string_diff(self.left.source, self.right.source)
+
 class Proof():
     def __init__(self, scheme: Type[Crypto.Scheme], experiment: Crypto.Experiment):
         self.scheme = scheme
         self.experiment = experiment
         self.proof_steps: List[ProofStep] = list()
         self.proof_checked = "unchecked"
+        # the source of each game, with the proof step it was made from (None for the starting and ending games), so
+        # that it is recomputed if proof_steps changes; and the canonicalization of each game source
+        self.game_srcs: Dict[Tuple[int, bool], Tuple[Optional[ProofStep], str]] = dict()
+        self.canonical_forms: Dict[str, verification.CanonicalForm] = dict()
 
     def add_distinguishing_proof_step(self, reduction: Type[Crypto.Reduction], experiment: Crypto.DistinguishingExperiment, scheme: Type[Crypto.Scheme], schemeName: str, reverse_direction = False) -> None:
         """Add a distinguishing proof step for a reduction 'reduction' against the distinguishing security experiment 'experiment' for a scheme 'scheme'.
         If reverse_direction == False, the "left" and "right" sides of the game hopping proof are lined up with the get_left and get_right methods of the given distinguishing experiment, and are swapped if reverse_direction == True."""
         self.proof_steps.append(DistinguishingProofStep(reduction, experiment, scheme, schemeName, reverse_direction, self.experiment, self.scheme))
 
+    def add_hybrid_proof_step(self, reduction: Type[Crypto.Reduction], index_name: str, n: int, experiment: Crypto.DistinguishingExperiment, scheme: Type[Crypto.Scheme], schemeName: str, reverse_direction = False) -> None:
+        """Add the n hops of a hybrid argument, in which hop i is a distinguishing proof step (see
+        add_distinguishing_proof_step) for the reduction 'reduction' with the variable index_name bound to i, for i = 0, ..., n - 1.
+        index_name must be a variable that the reduction only reads and never defines.  As usual the game after hop i
+        must be equivalent to the game before hop i + 1.  The reduction is only inlined into each side of the experiment
+        once, however large n is, and the advantage bound counts the hops as a single term of n times the advantage of
+        the reduction with a random index."""
+        hybrid = HybridArgument(reduction, index_name, n, experiment, scheme, schemeName, reverse_direction, self.experiment, self.scheme)
+        for index in range(n):
+            self.proof_steps.append(HybridProofStep(hybrid, index))
+
     def add_rewriting_proof_step(self, rewrite_left: Type[Crypto.Game], rewrite_right: Type[Crypto.Game]) -> None:
         """Add a rewriting proof step asserting (without computer verification) that the games rewrite_left and rewrite_right are equivalent to each other."""
         self.proof_steps.append(RewritingStep(rewrite_left, rewrite_right))
@@ -77,7 +167,7 @@ class Proof():
     def insert_simple_rewriting_proof_step_before(self, rewrites: Dict[str, str], gamenum: Optional[int] = None) -> None:
         """Add a rewriting step that's constructed by using string replacements as specified in rewrites. The string replacements will be applied to the *uncanonicalized* form of game gamenum (where gamenum is the currently last game, if unspecified). However, this method works in "reverse" compared to insert_simple_rewriting_proof_step_after: the effect of this will be to add a rewriting step of the form (left=copy_of_game_gamenum_with_replacements, right=copy_of_game_gamenum_unchanged) immediately *before* game gamenum.  Note this means that this method must be called after gamenum has been added."""
         if gamenum is None: gamenum = len(self.proof_steps) - 1
-        next_game_src = self.proof_steps[gamenum].get_left_src()
+        next_game_src = self.get_game_src(gamenum, False)
         prev_game_src = copy.copy(next_game_src)
         for k in rewrites:
             prev_game_src = prev_game_src.replace(k, rewrites[k])
@@ -86,6 +176,18 @@ class Proof():
             cast(Type[Crypto.Game], utils.get_class_def(next_game_src))))
 
     def get_game_src(self, gamenum: int, before_hop = True) -> str:
+        """Returns the source of game gamenum before or after the hop into it.  The sources are memoized, as long as the
+        proof step they are made from is still at the same place in proof_steps."""
+        if gamenum == -1: gamenum = len(self.proof_steps)
+        if before_hop: step = self.proof_steps[gamenum - 1] if 0 < gamenum <= len(self.proof_steps) else None
+        else: step = self.proof_steps[gamenum] if 0 <= gamenum < len(self.proof_steps) else None
+        memoized = self.game_srcs.get((gamenum, before_hop))
+        if memoized is not None and memoized[0] is step: return memoized[1]
+        game_src = self._get_game_src(gamenum, before_hop)
+        self.game_srcs[(gamenum, before_hop)] = (step, game_src)
+        return game_src
+
+    def _get_game_src(self, gamenum: int, before_hop: bool) -> str:
         if gamenum == 0 and before_hop: # use the original experiment
             if isinstance(self.experiment, Crypto.DistinguishingExperiment):
                 return inlining.inline_scheme_into_game(self.scheme, self.experiment.get_left(), game_name = "G", adversary_package = self.experiment.get_primitive_name())
@@ -109,13 +211,13 @@ class Proof():
         elif 0 <= gamenum < len(self.proof_steps) and not(before_hop): # use the reduction inlined into the left side of its experiment
             step = self.proof_steps[gamenum]
             if isinstance(step, DistinguishingProofStep):
-                return f"reduction {utils.fqn(step.reduction)} inlined into game {utils.fqn(step.get_left_game())} for {utils.typefqn(step.scheme)} scheme {step.schemeName}"
+                return f"reduction {step.reduction_name()} inlined into game {utils.fqn(step.get_left_game())} for {utils.typefqn(step.scheme)} scheme {step.schemeName}"
             elif isinstance(step, RewritingStep):
                 return "rewriting step before rewriting"
         elif 0 < gamenum <= len(self.proof_steps) and before_hop: # use the reduction inlined into the right side of its experiment
             step = self.proof_steps[gamenum - 1]
             if isinstance(step, DistinguishingProofStep):
-                return f"reduction {utils.fqn(step.reduction)} inlined into game {utils.fqn(step.get_right_game())} for {utils.typefqn(step.scheme)} scheme {step.schemeName}"
+                return f"reduction {step.reduction_name()} inlined into game {utils.fqn(step.get_right_game())} for {utils.typefqn(step.scheme)} scheme {step.schemeName}"
             elif isinstance(step, RewritingStep):
                 return "rewriting step after rewriting"
         elif (gamenum == -1 or gamenum == len(self.proof_steps)) and not(before_hop): # use the final experiment
@@ -123,50 +225,116 @@ class Proof():
                 return f"game {utils.fqn(self.experiment.get_right())} with {utils.typefqn(self.scheme)} scheme {utils.fqn(self.scheme)} inlined"
         raise NotImplementedError()
 
-    def check(self, print_hops=False, print_canonicalizations=False, print_diffs=True, show_call_graphs=False, abort_on_failure=True) -> bool:
+    def check(self, print_hops=False, print_canonicalizations=False, print_diffs=True, show_call_graphs=False, abort_on_failure=True, workers: Optional[int] = None, cache: Optional[canonicalization_cache.CanonicalizationCache] = None, profile: Optional[Profile] = None) -> bool:
+        """Check that each game hop of the proof is valid by comparing canonicalizations of the games on either side of it.
+        The hops are checked by hops(), with the given workers, cache and profile; this prints each HopResult as it is
+        yielded and returns whether all of them are valid.  If abort_on_failure is True, it stops at the first invalid one."""
+        hops = self.hops(workers, cache, profile)
         result = True
-        self.proof_checked = "valid"
-        def print_hop(game_src, game_src_canonicalized):
-            if print_hops:
-                print(game_src)
-                # print("---- textified ----")
-                # print(textify(game_src))
-                if print_canonicalizations:
-                    print("---- canonicalization ----")
-                    print(game_src_canonicalized)
-                    # print("---- textified ----")
-                    # print(textify(game_src_canonicalized))
-                if show_call_graphs: verification.canonicalization.show_call_graph(utils.get_function_def(game_src_canonicalized))
-
-        for gamenum in range(len(self.proof_steps) + 1):
-            print(f"==== GAME {gamenum} ====")
-            if gamenum == 0: print(f"---- starting game: {self.get_game_description(gamenum, True)} --- ")
-            else: print(f"---- after hop: {self.get_game_description(gamenum, True)} --- ")
-            left_game_src = self.get_game_src(gamenum, True)
-            left_game_src_canonicalized = verification.canonicalize_game(left_game_src)
-            print_hop(left_game_src, left_game_src_canonicalized)
-            if gamenum == len(self.proof_steps): print(f"---- ending game: {self.get_game_description(gamenum, False)} --- ")
-            else: print(f"---- before hop: {self.get_game_description(gamenum, False)} --- ")
-            right_game_src = self.get_game_src(gamenum, False)
-            right_game_src_canonicalized = verification.canonicalize_game(right_game_src)
-            print_hop(right_game_src, right_game_src_canonicalized)
-
-            if gamenum < len(self.proof_steps) and isinstance(self.proof_steps[gamenum], RewritingStep) and print_hops:
-                step = self.proof_steps[gamenum]
-                print(f"---- diff of rewriting step ----")
-                utils.stringDiff(step.get_left_src(), step.get_right_src())
-
-            if left_game_src_canonicalized != right_game_src_canonicalized:
-                print("❌ canoncalizations are NOT equal")
-                if print_diffs: utils.stringDiff(left_game_src_canonicalized, right_game_src_canonicalized)
-                self.proof_checked = "invalid"
-                result = False
-                if abort_on_failure: return result
-            else:
-                print("✅ canoncalizations are equal")
+        try:
+            for hop in hops:
+                print(f"==== GAME {hop.gamenum} ====")
+                if hop.gamenum == 0: print(f"---- starting game: {hop.left_description} --- ")
+                else: print(f"---- after hop: {hop.left_description} --- ")
+                self.print_game(hop.left_src, hop.left, print_hops, print_canonicalizations, show_call_graphs)
+                if hop.gamenum == len(self.proof_steps): print(f"---- ending game: {hop.right_description} --- ")
+                else: print(f"---- before hop: {hop.right_description} --- ")
+                self.print_game(hop.right_src, hop.right, print_hops, print_canonicalizations, show_call_graphs)
+
+                if hop.gamenum < len(self.proof_steps) and isinstance(self.proof_steps[hop.gamenum], RewritingStep) and print_hops:
+                    step = self.proof_steps[hop.gamenum]
+                    print(f"---- diff of rewriting step ----")
+                    utils.stringDiff(step.get_left_src(), step.get_right_src())
 
+                if not hop.valid:
+                    print("❌ canoncalizations are NOT equal")
+                    if print_diffs: print(hop.diff(), end="\n")
+                    result = False
+                    if abort_on_failure: break
+                else:
+                    print("✅ canoncalizations are equal")
+        finally:
+            hops.close()
         return result
 
+    def print_game(self, game_src: str, game_canonicalized: verification.CanonicalForm, print_hops: bool, print_canonicalizations: bool, show_call_graphs: bool) -> None:
+        if print_hops:
+            print(game_src)
+            # print("---- textified ----")
+            # print(textify(game_src))
+            if print_canonicalizations:
+                print("---- canonicalization ----")
+                print(game_canonicalized.source)
+                # print("---- textified ----")
+                # print(textify(game_canonicalized.source))
+            if show_call_graphs: verification.canonicalization.show_call_graph(utils.get_function_def(game_canonicalized.source))
+
+    def hops(self, workers: Optional[int] = None, cache: Optional[canonicalization_cache.CanonicalizationCache] = None, profile: Optional[Profile] = None) -> Iterator[HopResult]:
+        """Checks the hops of the proof, yielding a HopResult for each game in order as soon as both of its sides are
+        canonicalized.  The check can be stopped by not iterating any further; closing the generator also shuts down
+        its worker processes.  proof_checked is set to "invalid" before yielding the first invalid HopResult, and to
+        "valid" after yielding the last one if all of them are valid.
+        If workers is more than 1, the games are canonicalized in parallel by a pool of that many processes;
+        results are still yielded in order of the games.  The games are inlined in this process and only their
+        source is sent to the workers, so the proof's classes need not be importable by the workers.
+        Canonicalizations are looked up in and stored to cache, which defaults to the one in the directory named by
+        the GAMEHOP_CACHE_DIR environment variable (no caching if it is not set).  The cache hits and misses of the
+        workers are added to the counters of cache.
+        If profile is given, the time taken to inline and canonicalize each game is recorded in it (see Profile); when
+        canonicalizing in worker processes, it only records the time spent waiting for each game, not its passes.
+        The source of each game and the canonicalization of each distinct source are memoized (see get_game_src), so
+        games with the same source are only canonicalized once, including by later checks of this proof.
+        The games on either side of a hop are compared by the fingerprints of their canonicalizations (see
+        verification.fingerprint); their canonicalized source is only used to print them or their diff."""
+        with profiled(profile, utils.fqn(self.scheme), 'proof'):
+            yield from self._hops(workers, cache, profile)
+
+    def _hops(self, workers, cache, profile) -> Iterator[HopResult]:
+        if cache is None: cache = canonicalization_cache.default_cache()
+        self.proof_checked = "unchecked"
+        valid = True
+
+        # each (gamenum, before_hop) game is independent, so inline them all up front, submit the canonicalizations
+        # of the sources not canonicalized yet and collect them in order
+        executor = ProcessPoolExecutor(max_workers=workers) if workers is not None and workers > 1 else None
+        if executor is not None:
+            games_src = dict()
+            for gamenum in range(len(self.proof_steps) + 1):
+                for before_hop in (True, False):
+                    with profiled(profile, f"game {gamenum}", 'inline', gamenum = gamenum, before_hop = before_hop):
+                        games_src[(gamenum, before_hop)] = self.get_game_src(gamenum, before_hop)
+            futures = { game_src: executor.submit(_canonicalize, game_src, cache) for game_src in set(games_src.values()) if game_src not in self.canonical_forms }
+        def get_hop(gamenum, before_hop):
+            if executor is None:
+                with profiled(profile, f"game {gamenum}", 'inline', gamenum = gamenum, before_hop = before_hop):
+                    game_src = self.get_game_src(gamenum, before_hop)
+                with profiled(profile, f"game {gamenum}", 'hop', gamenum = gamenum, before_hop = before_hop):
+                    if game_src not in self.canonical_forms:
+                        (self.canonical_forms[game_src], _, _) = _canonicalize(game_src, cache, profile)
+                return (game_src, self.canonical_forms[game_src])
+            game_src = games_src[(gamenum, before_hop)]
+            with profiled(profile, f"game {gamenum}", 'hop', gamenum = gamenum, before_hop = before_hop):
+                if game_src not in self.canonical_forms:
+                    (self.canonical_forms[game_src], hits, misses) = futures[game_src].result()
+                    if cache is not None:
+                        cache.hits += hits
+                        cache.misses += misses
+            return (game_src, self.canonical_forms[game_src])
+
+        try:
+            for gamenum in range(len(self.proof_steps) + 1):
+                start = time.perf_counter()
+                left_game_src, left_game_canonicalized = get_hop(gamenum, True)
+                right_game_src, right_game_canonicalized = get_hop(gamenum, False)
+                hop = HopResult(gamenum, self.get_game_description(gamenum, True), left_game_src, left_game_canonicalized, self.get_game_description(gamenum, False), right_game_src, right_game_canonicalized, time.perf_counter() - start)
+                if not hop.valid:
+                    self.proof_checked = "invalid"
+                    valid = False
+                yield hop
+        finally:
+            if executor is not None: executor.shutdown(cancel_futures=True)
+        if valid: self.proof_checked = "valid"
+
     def advantage_bound(self) -> str:
         if self.proof_checked == "unchecked":
             raise ValueError("Cannot compute advantage bound, proof has not been checked")
@@ -175,9 +343,11 @@ class Proof():
         lines = []
         lines.append(f"Advantage of adversary in experiment {self.experiment.get_primitive_name()}.{self.experiment.get_experiment_name()} for {utils.typefqn(self.scheme)} scheme {utils.fqn(self.scheme)}")
         lines.append("≤")
-        for stepnum, step in enumerate(self.proof_steps):
-            lines.append(step.advantage())
-            if stepnum < len(self.proof_steps) - 1: lines.append("+")
+        # the hops of a hybrid argument make a single term
+        terms = [ step.hybrid.advantage() if isinstance(step, HybridProofStep) else step.advantage() for step in self.proof_steps if not(isinstance(step, HybridProofStep) and step.index > 0) ]
+        for termnum, term in enumerate(terms):
+            lines.append(term)
+            if termnum < len(terms) - 1: lines.append("+")
         return "\n".join(lines)
 
     def tikz_figure(self):
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from collections import namedtuple
-from typing import Optional, List,  Dict
+from typing import Optional, List,  Dict, Set
 import ast
 from . import bits
 
@@ -27,6 +27,8 @@ ObjectEvent = namedtuple("ObjectEvent", ["eventType", "stmt"])
 class ObjectValue():
     '''Used it Scope() objects to store the value for an object associated with a variable.
     ObjectValue stores a dictionary of ObjectValues corresponding to its attributes'''
+    __slots__ = ('events', 'attributes', '_value', '_annotation', '_method_purity')
+
     def __init__(self, assigner: Optional[ast.stmt], value: Optional[ast.AST] = None, methodpurity: Optional[MethodPurity] = None ):
         self.events: List = list()
         if assigner:
@@ -49,7 +51,7 @@ class ObjectValue():
 
 
 
-    def modifier_stmts(self, fqn: List[str]) -> List[ast.stmt]:
+    def modifier_stmts(self, fqn: bits.FQN) -> List[ast.stmt]:
         ''' Returns a list of statements that have modified this object.  This includes 
         the original assigner statement, any statements that call methods on this object,
         and any modifier statements for attributes of this object.'''        
@@ -65,12 +67,12 @@ class ObjectValue():
                 # Return whatever modified this object itself.
                 return ret
             else:
-                return bits.unique_elements(ret + self.attributes[fqn[0]].modifier_stmts(fqn[1:]))
+                return bits.unique_elements(ret + self.attributes[fqn[0]].modifier_stmts(fqn.attribute_path))
 
         # fqn is empty, so we need modifiers of this ObjectValue, plus those from any attributes
         ret.extend([ e.stmt for e in self.events if e.eventType == 'attribute_assign'])
         for attr in self.attributes.values():
-            ret.extend(attr.modifier_stmts([]))
+            ret.extend(attr.modifier_stmts(bits.EMPTY_FQN))
         return bits.unique_elements(ret)
 
     def loader_stmts(self) -> List[ast.stmt]:
@@ -81,7 +83,7 @@ class ObjectValue():
             ret.extend(attr.loader_stmts())
         return ret
 
-    def add_load(self, fqn: List[str], stmt: ast.stmt) -> bool:
+    def add_load(self, fqn: bits.FQN, stmt: ast.stmt) -> bool:
         ''' Records that this object value has been loaded, and by which statement.  Recurses
         to attributes if necessary.  Returns True if the fqn was found, otherwise False, indicating
         that the fqn was not explicitly set before loading.'''
@@ -100,10 +102,10 @@ class ObjectValue():
             if attr not in self.attributes:
                 self.attributes[attr] = ObjectValue(None, None)
                 ret = False
-            ret &= self.attributes[attr].add_load(fqn[1:], stmt)
+            ret &= self.attributes[attr].add_load(fqn.attribute_path, stmt)
         return ret
 
-    def add_attribute_assignment(self, fqn: List[str], assigner: ast.stmt, value: Optional[ast.expr], method_purity: Optional[MethodPurity] = None) -> None:
+    def add_attribute_assignment(self, fqn: bits.FQN, assigner: ast.stmt, value: Optional[ast.expr], method_purity: Optional[MethodPurity] = None) -> None:
         assert(len(fqn) > 0)
 
         # The value currently stored for this object is no longer valid since one of its attributes has changed
@@ -119,11 +121,11 @@ class ObjectValue():
             # Here we create an attribute to keep track of the fact that it was loaded.
             if attr not in self.attributes: 
                 self.attributes[attr] = ObjectValue(None, None, method_purity)
-            self.attributes[attr].add_attribute_assignment(fqn[1:], assigner, value, method_purity)
+            self.attributes[attr].add_attribute_assignment(fqn.attribute_path, assigner, value, method_purity)
         else:
             self.attributes[attr] = ObjectValue(assigner, value, method_purity)
            
-    def add_method_call(self, fqn: List[str], stmt: ast.stmt) -> None:
+    def add_method_call(self, fqn: bits.FQN, stmt: ast.stmt) -> None:
         if len(fqn) == 0:
             # This is the method called.  Just keep track that it was loaded/used.
             self.events.append(ObjectEvent('call', stmt))
@@ -149,31 +151,31 @@ class ObjectValue():
             if attr not in self.attributes:
                 self.attributes[attr] = ObjectValue(None, None)
 
-            self.attributes[attr].add_method_call(fqn[1:], stmt)
+            self.attributes[attr].add_method_call(fqn.attribute_path, stmt)
 
-    def method_purity(self, fqn: List[str]) -> Optional[List[int]]:
+    def method_purity(self, fqn: bits.FQN) -> Optional[List[int]]:
         assert len(fqn) > 0
         if len(fqn) == 1:
             if fqn[0] in self._method_purity:
                 return self._method_purity[fqn[0]]
             else:
                 return list()
-        return self.attributes[fqn[0]].method_purity(fqn[1:])
+        return self.attributes[fqn[0]].method_purity(fqn.attribute_path)
 
 
-    def value(self, fqn: List[str]) -> Optional[ast.AST]:
+    def value(self, fqn: bits.FQN) -> Optional[ast.AST]:
         if len(fqn) == 0:
             return self._value
         
         if fqn[0] not in self.attributes:
             return None
 
-        return self.attributes[fqn[0]].value(fqn[1:])
+        return self.attributes[fqn[0]].value(fqn.attribute_path)
     
-    def assigned(self, fqn: List[str] = list()) -> bool:
+    def assigned(self, fqn: bits.FQN = bits.EMPTY_FQN) -> bool:
         return self.assigner(fqn) is not None
 
-    def assigner(self, fqn: List[str] = list()) -> Optional[ast.stmt]:
+    def assigner(self, fqn: bits.FQN = bits.EMPTY_FQN) -> Optional[ast.stmt]:
         if len(fqn) == 0:
             assignEvents = [ e for e in self.events if e.eventType == 'assign' ]
             if assignEvents:
@@ -184,22 +186,22 @@ class ObjectValue():
         if fqn[0] not in self.attributes:
             return None
 
-        return self.attributes[fqn[0]].assigner(fqn[1:])
+        return self.attributes[fqn[0]].assigner(fqn.attribute_path)
 
-    def annotation(self, fqn: List[str]):
+    def annotation(self, fqn: bits.FQN):
         if len(fqn) == 0:
             return self._annotation
         
         if fqn[0] not in self.attributes:
             return None
 
-        return self.attributes[fqn[0]].annotation(fqn[1:])
+        return self.attributes[fqn[0]].annotation(fqn.attribute_path)
 
-    def in_scope(self, fqn: List[str]):
-        if len(fqn) == 0 and self.assigner([]):
+    def in_scope(self, fqn: bits.FQN):
+        if len(fqn) == 0 and self.assigner(bits.EMPTY_FQN):
             return True
         if fqn[0] in self.attributes:
-            return self.attributes[fqn[0]].in_scope(fqn[1:])
+            return self.attributes[fqn[0]].in_scope(fqn.attribute_path)
         return False
     
     def sub_attributes(self) -> List[str]:
@@ -223,16 +225,23 @@ class Scope():
     parameters currently in scope, plus additional information such as the most
     recently assigned value, and any variables that were referenced that were
     not in this scope at the time.
+
+    Copies are copy-on-write: copy() shares the ObjectValues of all variables between
+    the two scopes, and each scope copies the ObjectValue of a variable before it first
+    modifies it (see modifiable_value).
     '''
+    __slots__ = ('parameters', 'parameter_values', 'parameter_index', 'parameter_indices_loaded', 'vars_loaded', 'vars_stored',
+                 'variables', 'owned', 'external_vars', 'report_values', 'store_values', 'type_method_purity')
+
     def __init__(self, typeMethodPurity: Optional[TypeMethodPurity] = None):
         self.parameters: List[str] = list()                            # function parameters defined in this scope
         self.parameter_values: List[ObjectValue] = list()              # Stores parameter ObjectValues in order, in case the parameter name gets bound to another object
-        self.parameter_values_loaded: List[ObjectValue] = list()       # Stores values for parameters in the order that they are loaded
-        self.vars_loaded: List[str] = list()                           # variable names that have been loaded, in order by first load
-        self.vars_stored: List[str] = list()                           # variable names that have been stored, in order by first store
-        self.values_loaded: List[ObjectValue] = list()
+        self.parameter_index: Dict[ObjectValue, int] = dict()          # Index in parameters of each parameter ObjectValue
+        self.parameter_indices_loaded: Dict[int, None] = dict()        # Indices of the parameters loaded, in order by first load
+        self.vars_loaded: Dict[str, None] = dict()                     # variable names that have been loaded, in order by first load
+        self.vars_stored: Dict[str, None] = dict()                     # variable names that have been stored, in order by first store
         self.variables: Dict[str, ObjectValue] = dict()               # Variable names and their currently assigned ObjectValue
-        self.object_values: List[ObjectValue] = list()
+        self.owned: Set[str] = set()                                   # Variables whose ObjectValue is not shared with a copy of this scope
         self.external_vars: List[str] = list()                         # variables loaded that were not previously stored and are not parameters
 
         self.report_values: bool = True           # In some cases (eg. while loops) we don't want to report the value of variables.
@@ -244,18 +253,36 @@ class Scope():
         ret = Scope()
         ret.parameters = list(self.parameters)
         ret.parameter_values = list(self.parameter_values)
-        ret.vars_loaded = list(self.vars_loaded)
-        ret.vars_stored = list(self.vars_stored)
-        ret.values_loaded = list(self.values_loaded)
-        for var, val in self.variables.items():
-            ret.variables[var] = val.copy()
-        for val in self.object_values:
-            ret.object_values.append(val.copy())
+        # parameter_index stays empty: a copy does not keep track of which parameters are loaded
+        ret.vars_loaded = dict(self.vars_loaded)
+        ret.vars_stored = dict(self.vars_stored)
+        ret.variables = dict(self.variables)
+        # The ObjectValues are now shared, so neither scope may modify them in place
+        self.owned = set()
         ret.external_vars = list(self.external_vars)
         ret.report_values = self.report_values
         ret.store_values = self.store_values
         return ret
 
+    def modifiable_value(self, var: str) -> ObjectValue:
+        ''' Returns the ObjectValue of the given variable, first replacing it by a copy if
+        it is shared with a copy of this scope.'''
+        val = self.variables[var]
+        if var in self.owned:
+            return val
+        new_val = val.copy()
+        if val in self.parameter_index:
+            i = self.parameter_index.pop(val)
+            self.parameter_index[new_val] = i
+            self.parameter_values[i] = new_val
+        self.set_value(var, new_val)
+        return new_val
+
+    def set_value(self, var: str, val: ObjectValue) -> None:
+        ''' Binds the given variable to a new ObjectValue.'''
+        self.variables[var] = val
+        self.owned.add(var)
+
     def add_parameter(self, par_name, annotation = None):
         self.parameters.append(par_name)
         method_purity = None
@@ -264,16 +291,15 @@ class Scope():
         parobj = ObjectValue(None, None, method_purity)
         parobj._annotation = annotation
 
-        self.variables[par_name] = parobj
+        self.set_value(par_name, parobj)
+        self.parameter_index[parobj] = len(self.parameter_values)
         self.parameter_values.append(parobj)
 
     def parameters_loaded(self):
-        # Searching over the values_loaded so that we get them in order
         ret = []
-        for obj in self.parameter_values_loaded:
+        for i in self.parameter_indices_loaded:
             # Get the original name of the parameter
-            i = self.parameter_values.index(obj)
-            ret.append((self.parameters[i], obj._annotation))
+            ret.append((self.parameters[i], self.parameter_values[i]._annotation))
         # We only want each parameter to appear once
         return bits.unique_elements(ret)
 
@@ -281,39 +307,39 @@ class Scope():
         # TODO: annotations and method purity
         fqn = bits.str_fqn(varname)
         assert(len(fqn) > 0)
-        self.vars_stored.append(bits.fqn_str(fqn))
+        self.vars_stored[fqn.name] = None
 
         method_purity = None
         if annotation and annotation in self.type_method_purity:
             method_purity = self.type_method_purity[annotation]
         
         if len(fqn) == 1:
-            self.variables[fqn[0]] = ObjectValue(assigner, value, method_purity)
+            self.set_value(fqn[0], ObjectValue(assigner, value, method_purity))
         else:
             if fqn[0] not in self.variables:
                 # Attempt to assign to an attribute of an object that is not in scope.
                 # This can happen when keeping track of an assignment to an attribute in a
                 # statement scope.  We need to create an empty object to keep track of the assignment.
-                self.variables[fqn[0]] = ObjectValue(None, None)
+                self.set_value(fqn[0], ObjectValue(None, None))
 
-            self.variables[fqn[0]].add_attribute_assignment(fqn[1:], assigner, value, method_purity)
+            self.modifiable_value(fqn[0]).add_attribute_assignment(fqn.attribute_path, assigner, value, method_purity)
 
     def add_var_store(self, varname: str, assigner: ast.stmt, )-> None:
         fqn = bits.str_fqn(varname)
         assert(len(fqn) > 0)
-        self.vars_stored.append(bits.fqn_str(fqn))
+        self.vars_stored[fqn.name] = None
 
         if len(fqn) == 1:
-            self.variables[fqn[0]] = ObjectValue(assigner, None)
+            self.set_value(fqn[0], ObjectValue(assigner, None))
         else:
             if fqn[0] not in self.variables:
                 # Attempt to assign to an attribute of an object that is not in scope.
                 # This can happen when keeping track of an assignment to an attribute in a
                 # statement scope.  We need to create an empty object to keep track of the assignment.
-                self.variables[fqn[0]] = ObjectValue(None, None)
+                self.set_value(fqn[0], ObjectValue(None, None))
             
             # TODO: is this the correct thing?  This probably came from a function call with this possibly written to.
-            self.variables[fqn[0]].add_attribute_assignment(fqn[1:], assigner, None)
+            self.modifiable_value(fqn[0]).add_attribute_assignment(fqn.attribute_path, assigner, None)
     
 
     def add_var_load(self, varname: str, stmt: ast.stmt):
@@ -323,20 +349,20 @@ class Scope():
         '''
         fqn = bits.str_fqn(varname)
 
-        if not self.in_scope(varname):
+        if fqn[0] not in self.variables:    # same as not self.in_scope(varname)
             self.external_vars.append(varname)
-        if fqn[0] in self.variables and self.variables[fqn[0]] in self.parameter_values:
-            self.parameter_values_loaded.append(self.variables[fqn[0]])
+        if fqn[0] in self.variables and self.variables[fqn[0]] in self.parameter_index:
+            self.parameter_indices_loaded[self.parameter_index[self.variables[fqn[0]]]] = None
 
         assert(len(fqn) > 0)
-        self.vars_loaded.append(fqn[0])
+        self.vars_loaded[fqn[0]] = None
         ret = True
 
         if fqn[0] not in self.variables:
-            self.variables[fqn[0]] = ObjectValue(None, None)
+            self.set_value(fqn[0], ObjectValue(None, None))
             return False
 
-        self.variables[fqn[0]].add_load(fqn[1:], stmt)
+        self.modifiable_value(fqn[0]).add_load(fqn.attribute_path, stmt)
         return ret 
  
     def vars_and_attributes_stored(self) -> List[str]:
@@ -366,35 +392,35 @@ class Scope():
         assert(len(fqn) > 0)
         if fqn[0] not in self.variables:
             return None
-        return self.variables[fqn[0]].value(fqn[1:])
+        return self.variables[fqn[0]].value(fqn.attribute_path)
 
     def var_assigner(self, varname: str, ignore_attribute_assigns = False) -> Optional[ast.stmt]:
         fqn = bits.str_fqn(varname)
         assert(len(fqn) > 0)
         if fqn[0] not in self.variables:
             return None
-        return self.variables[fqn[0]].assigner(fqn[1:])
+        return self.variables[fqn[0]].assigner(fqn.attribute_path)
 
     def var_modifiers(self, varname: str) -> List[ast.stmt]:
         fqn = bits.str_fqn(varname)
         assert(len(fqn) > 0)
         if fqn[0] not in self.variables:
             return []
-        return self.variables[fqn[0]].modifier_stmts(fqn[1:])
+        return self.variables[fqn[0]].modifier_stmts(fqn.attribute_path)
 
     def var_annotation(self, varname: str):
         fqn = bits.str_fqn(varname)
         assert(len(fqn) > 0)
         if fqn[0] not in self.variables:
             return None
-        return self.variables[fqn[0]].annotation(fqn[1:])
+        return self.variables[fqn[0]].annotation(fqn.attribute_path)
 
     def method_purity(self, methodname: str) -> Optional[List[int]]:
         fqn = bits.str_fqn(methodname)
         assert(len(fqn) > 0)
         if len(fqn) > 1:
             # This is a method call.  Check the objects first
-            ret = self.variables[fqn[0]].method_purity(fqn[1:])
+            ret = self.variables[fqn[0]].method_purity(fqn.attribute_path)
             if ret:
                 return ret
             
@@ -415,7 +441,7 @@ class Scope():
 
     def add_method_call(self, varname: str, caller: ast.stmt) -> None:
         fqn = bits.str_fqn(varname)
-        if not self.in_scope(varname):            
-            self.variables[fqn[0]] = ObjectValue(None, None)
+        if fqn[0] not in self.variables:    # same as not self.in_scope(varname)
+            self.set_value(fqn[0], ObjectValue(None, None))
 
-        self.variables[fqn[0]].add_method_call(fqn[1:], caller)
+        self.modifiable_value(fqn[0]).add_method_call(fqn.attribute_path, caller)
@@ -0,0 +1,327 @@
+"""Generates games, schemes and reductions of configurable size and shape, for benchmarking and fuzzing the inlining and
+canonicalization engine on code much larger than the examples.
+
+A Synthesizer makes random code out of calls to the functions f0, f1, ..., which are left undefined, optionally with if
+statements nested up to a given depth, tuple unpacking and lambdas.  Every value computed is used, so none of the code
+is dead.  The same code can also be written as a variant in which the statements are reordered as far as their
+dependencies allow, local variables are renamed, some calls are nested into the expressions using their results, and
+useless assignments and dead statements are added.  The canonicalizations of both are equal by construction:
+
+    s = Synthesizer(seed = 1, statements = 100, oracles = 2, if_depth = 2, tuples = True, lambdas = True)
+    assert canonicalize_game(s.game()) == canonicalize_game(s.game(variant = True))
+
+proof_module writes a module defining a PKE scheme that post-processes the ciphertexts of another one with such code, and
+a reduction to the IND-CPA security of the other scheme that applies the variant of the code to its challenge
+ciphertext, so that the proof in the module is valid by construction.  hybrid_module writes a module whose proof is a
+hybrid argument with a given number of hops.  load_module imports such modules so that the classes in them can be
+inlined.
+"""
+import ast
+import importlib.util
+import itertools
+import os
+import random
+import sys
+import types
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import utils
+
+FUNCTIONS = 10
+MAX_ARGS = 4
+
+# the beginning of the modules written by proof_module and hybrid_module
+HEADER = [
+    "from typing import Generic, Tuple, Type, TypeVar",
+    "",
+    "from gamehop.primitives import Crypto, PKE",
+    "from gamehop.primitives.PKE import PKEScheme",
+    "from gamehop.proofs2 import Proof",
+    "",
+    "PK = TypeVar('PK')",
+    "SK = TypeVar('SK')",
+    "CT = TypeVar('CT')",
+    "PT = TypeVar('PT')",
+    "",
+    "InnerPKE = PKEScheme[PK, SK, CT, PT]",
+    "",
+]
+
+REDUCTION_INIT = [
+    "    def __init__(self, Scheme: Type[PKEScheme[PK, SK, CT, PT]], inner_adversary: PKE.INDCPA_Adversary[PK, SK, CT, PT]):",
+    "        self.Scheme = Scheme",
+    "        self.inner_adversary = inner_adversary",
+]
+
+def _stmt(src: str) -> ast.stmt:
+    return ast.parse(src).body[0]
+
+def _loads(stmt: ast.stmt) -> Set[str]:
+    return { n.id for n in ast.walk(stmt) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load) }
+
+def _stores(stmt: ast.stmt) -> Set[str]:
+    return { n.id for n in ast.walk(stmt) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store) }
+
+def _assign(stmt: ast.stmt) -> ast.Assign:
+    assert isinstance(stmt, ast.Assign)
+    return stmt
+
+def _indent(lines: List[str], indent: str) -> List[str]:
+    return [ indent + line for line in lines ]
+
+class Synthesizer():
+    """Generator of synthetic code; see the module docstring.  The arguments are:
+    - seed: the seed of the random choices, so the same arguments always give the same code;
+    - statements: the number of top-level statements of the main method of games and of the code of schemes (an if
+      statement, however deeply nested, counts as one);
+    - oracles: the number of oracles of games, each using a member set by main;
+    - oracle_statements: the number of top-level statements of each oracle;
+    - if_depth: the maximum depth of nested if statements, or 0 for none;
+    - tuples: whether to assign some results to tuples of variables;
+    - lambdas: whether to define and call some lambdas.
+    The functions called take at most MAX_ARGS arguments."""
+    def __init__(self, seed: int = 0, statements: int = 10, oracles: int = 0, oracle_statements: int = 3, if_depth: int = 0, tuples: bool = False, lambdas: bool = False):
+        self.seed = seed
+        self.statements = statements
+        self.oracles = oracles
+        self.oracle_statements = oracle_statements
+        self.if_depth = if_depth
+        self.tuples = tuples
+        self.lambdas = lambdas
+
+    def _call(self, rng: random.Random, args: List[str]) -> str:
+        return f"f{rng.randrange(FUNCTIONS)}({', '.join(args)})"
+
+    def _if(self, rng: random.Random, cond: str, available: List[str], target: str, depth: int) -> List[str]:
+        """Returns the lines of an if statement on cond, nested at most depth deep, whose branches all assign target."""
+        def branch() -> List[str]:
+            if depth > 1 and rng.random() < 0.5:
+                return self._if(rng, rng.choice(available), available, target, depth - 1)
+            return [ f"{target} = {self._call(rng, rng.sample(available, min(len(available), rng.randint(1, MAX_ARGS))))}" ]
+        return [ f"if {self._call(rng, [cond])}:" ] + _indent(branch(), "    ") + [ "else:" ] + _indent(branch(), "    ")
+
+    def _code(self, rng: random.Random, inputs: List[str], n: int) -> Tuple[List[ast.stmt], str, List[str]]:
+        """Returns n statements computing from the variables inputs, followed by statements combining all the values
+        computed into one variable; the name of that variable; and the variables available after the statements."""
+        available = list(inputs)
+        unused: List[str] = list()
+        stmts: List[ast.stmt] = list()
+        counter = itertools.count()
+        def fresh() -> str:
+            return f"v{next(counter)}"
+        def take(k: int) -> List[str]:
+            # use the oldest values that are not used yet first, so that all of them end up being used
+            args = list()
+            while unused and len(args) < k: args.append(unused.pop(0))
+            while len(args) < k: args.append(rng.choice(available))
+            return args
+        def define(targets: List[str], src: str) -> None:
+            stmts.append(_stmt(src))
+            available.extend(targets)
+            unused.extend(targets)
+        for _ in range(n):
+            kind = rng.random()
+            if self.if_depth > 0 and kind < 0.15:
+                target = fresh()
+                define([target], "\n".join(self._if(rng, take(1)[0], available, target, self.if_depth)))
+            elif self.tuples and kind < 0.3:
+                targets = [fresh(), fresh()]
+                define(targets, f"({', '.join(targets)}) = {self._call(rng, take(rng.randint(1, MAX_ARGS)))}")
+            elif self.lambdas and kind < 0.45:
+                # a lambda capturing a value, called right away (its definition and call count as one statement)
+                function = fresh()
+                stmts.append(_stmt(f"{function} = lambda p0, p1: {self._call(rng, ['p0', 'p1'] + take(1))}"))
+                target = fresh()
+                define([target], f"{target} = {function}({', '.join(take(2))})")
+            else:
+                target = fresh()
+                define([target], f"{target} = {self._call(rng, take(rng.randint(1, MAX_ARGS)))}")
+        while len(unused) != 1:
+            target = fresh()
+            define([target], f"{target} = {self._call(rng, take(max(1, min(len(unused), MAX_ARGS))))}")
+        return (stmts, unused[0], available)
+
+    def _variant(self, rng: random.Random, stmts: List[ast.stmt], output: str, inputs: List[str]) -> Tuple[List[ast.stmt], str]:
+        """Returns an equivalent version of the statements stmts, with the variable that output is now in."""
+        stmts = [ utils.copy_ast(stmt) for stmt in stmts ]
+        # nest some calls assigned to a variable into the call that is the only use of the variable
+        uses: Dict[str, int] = dict()
+        for stmt in stmts:
+            for n in ast.walk(stmt):
+                if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load): uses[n.id] = uses.get(n.id, 0) + 1
+        definitions: Dict[str, int] = dict()
+        for (i, stmt) in enumerate(stmts):
+            if isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Call):
+                for (j, arg) in enumerate(stmt.value.args):
+                    if isinstance(arg, ast.Name) and arg.id in definitions and uses[arg.id] == 1 and rng.random() < 0.3:
+                        definition = definitions.pop(arg.id)
+                        stmt.value.args[j] = _assign(stmts[definition]).value
+                        stmts[definition] = None # type: ignore
+                if len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name) and isinstance(stmt.value.func, ast.Name) and stmt.value.func.id.startswith("f"):
+                    definitions[stmt.targets[0].id] = i
+        stmts = [ stmt for stmt in stmts if stmt is not None ]
+        # add useless assignments, using the copy instead of the original from then on
+        copies = 0
+        i = 0
+        while i < len(stmts):
+            if not (isinstance(stmts[i], ast.Assign) and isinstance(_assign(stmts[i]).value, ast.Lambda)):
+                for var in sorted(_stores(stmts[i])):
+                    if rng.random() < 0.2:
+                        copy = f"c{copies}"
+                        copies += 1
+                        for stmt in stmts[i + 1:]: utils.rename_variables(stmt, { var: copy }, error_if_exists = False)
+                        if output == var: output = copy
+                        stmts.insert(i + 1, _stmt(f"{copy} = {var}"))
+            i += 1
+        # add dead statements
+        defined = list(inputs) + sorted(set().union(*[ _stores(stmt) for stmt in stmts ]) - { stmt.targets[0].id for stmt in stmts if isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Lambda) })
+        for d in range(len(stmts) // 10 + 1):
+            stmts.append(_stmt(f"d{d} = {self._call(rng, [rng.choice(defined)])}"))
+        # reorder the statements randomly, keeping each after the statements defining the variables it uses
+        definers = { var: i for (i, stmt) in enumerate(stmts) for var in _stores(stmt) }
+        dependencies = [ { definers[var] for var in _loads(stmt) if var in definers } for stmt in stmts ]
+        ready = [ i for i in range(len(stmts)) if not dependencies[i] ]
+        done: Set[int] = set()
+        order: List[int] = list()
+        while ready:
+            i = ready.pop(rng.randrange(len(ready)))
+            order.append(i)
+            done.add(i)
+            ready.extend(j for j in range(len(stmts)) if j not in done and j not in ready and dependencies[j] <= done)
+        stmts = [ stmts[i] for i in order ]
+        # rename the local variables
+        local_vars = sorted(set().union(*[ _stores(stmt) for stmt in stmts ]))
+        names = [ f"w{i}" for i in range(len(local_vars)) ]
+        rng.shuffle(names)
+        mapping = dict(zip(local_vars, names))
+        for stmt in stmts: utils.rename_variables(stmt, mapping, error_if_exists = False)
+        return (stmts, mapping[output] if output in mapping else output)
+
+    def _function(self, rng: random.Random, variant_rng: Optional[random.Random], header: List[str], prologue: List[str], inputs: List[str], n: int, epilogue: List[str], members: int = 0) -> List[str]:
+        """Returns the lines of a function made of header and prologue, n statements of code computing from inputs,
+        statements setting the members self.k0, ... to some of the values computed, and epilogue, in which {output}
+        stands for the variable holding the result of the code.  If variant_rng is given, the code is written as a variant."""
+        (stmts, output, available) = self._code(rng, inputs, n)
+        stmts += [ _stmt(f"self.k{i} = {rng.choice(available)}") for i in range(members) ]
+        if variant_rng is not None: (stmts, output) = self._variant(variant_rng, stmts, output, inputs)
+        body = prologue + [ line for stmt in stmts for line in ast.unparse(stmt).splitlines() ] + [ line.format(output = output) for line in epilogue ]
+        return header + _indent(body, "    ")
+
+    def game(self, variant: bool = False, name: str = "G") -> str:
+        """Returns the source of a game whose main method gets a value (two with tuples) from the adversary, computes
+        from it and gives the result to the adversary's guess.  Each oracle o_i computes from its argument and the
+        member self.ki, which main sets to one of the values it computes.  If variant is true the game is written
+        as a variant, which canonicalizes to the same as the game."""
+        rng = random.Random(self.seed)
+        variant_rng = random.Random(f"{self.seed}/variant") if variant else None
+        inputs = ["x0", "x1"] if self.tuples else ["x0"]
+        lines = [ f"class {name}(Crypto.Game):", "    def __init__(self, Adversary):", "        self.adversary = Adversary()" ]
+        lines += _indent(self._function(rng, variant_rng,
+            ["def main(self) -> Crypto.Bit:"],
+            [ f"({', '.join(inputs)}) = self.adversary.challenge()" if self.tuples else "x0 = self.adversary.challenge()" ],
+            inputs, self.statements,
+            ["r = self.adversary.guess({output})", "return r"],
+            members = self.oracles), "    ")
+        for i in range(self.oracles):
+            lines += _indent(self._function(rng, variant_rng, [f"def o_{i}(self, m):"], [], ["m", f"self.k{i}"], self.oracle_statements, ["return {output}"]), "    ")
+        return "\n".join(lines)
+
+    def proof_module(self, valid: bool = True) -> str:
+        """Returns the source of a module defining the PKE scheme SyntheticPKE, whose ciphertexts are those of
+        InnerPKE post-processed by code computing from them and the public key, a reduction SyntheticReduction applying
+        a variant of the same code to the ciphertext it is challenged with, and a function proof() returning the proof
+        that SyntheticPKE is IND-CPA-secure if InnerPKE is.  The proof is valid, unless valid is false, in which case the
+        reduction computes something else.  SyntheticPKE.Decrypt does not undo the post-processing."""
+        rng = random.Random(self.seed)
+        variant_rng = random.Random(f"{self.seed}/variant")
+        inputs = ["pk", "ct"]
+        encrypt = self._function(rng, None, ["@staticmethod", "def Encrypt(pk, msg):"], ["ct = InnerPKE.Encrypt(pk, msg)"], inputs, self.statements, ["return {output}"])
+        rng = random.Random(self.seed)
+        guess = self._function(rng, variant_rng, ["def guess(self, ct: CT) -> Crypto.Bit:"], ["pk = self.pk"], inputs, self.statements,
+            ["r = self.inner_adversary.guess({output})" if valid else f"r = self.inner_adversary.guess(f0({{output}}))", "return r"])
+        lines = HEADER + [
+            "class SyntheticPKE(Generic[PK, SK, CT, PT], PKEScheme[PK, SK, CT, PT]):",
+            "    @staticmethod",
+            "    def KeyGen():",
+            "        (pk, sk) = InnerPKE.KeyGen()",
+            "        return (pk, sk)",
+        ] + _indent(encrypt, "    ") + [
+            "    @staticmethod",
+            "    def Decrypt(sk, ct):",
+            "        return InnerPKE.Decrypt(sk, ct)",
+            "",
+            "class SyntheticReduction(Crypto.Reduction, Generic[PK, SK, CT, PT], PKE.INDCPA_Adversary[PK, SK, CT, PT]):",
+        ] + REDUCTION_INIT + [
+            "    def challenge(self, pk: PK) -> Tuple[PT, PT]:",
+            "        self.pk = pk",
+            "        (m0, m1) = self.inner_adversary.challenge(pk)",
+            "        return (m0, m1)",
+        ] + _indent(guess, "    ") + [
+            "",
+            "def proof() -> Proof:",
+            "    proof = Proof(SyntheticPKE, PKE.INDCPA)",
+            "    proof.add_distinguishing_proof_step(SyntheticReduction, PKE.INDCPA, InnerPKE, 'InnerPKE')",
+            "    return proof",
+        ]
+        return "\n".join(lines) + "\n"
+
+def hybrid_module(n: int, valid: bool = True) -> str:
+    """Returns the source of a module defining the PKE scheme MultiPKE, which encrypts the message under n keys of
+    InnerPKE, the reduction MultiReduction, which embeds its challenge as the ciphertext of index hybrid and encrypts
+    m1 under the keys before it and m0 under the keys after it, and a function proof() returning the proof that MultiPKE
+    is IND-CPA-secure if InnerPKE is, by a hybrid argument of n hops over hybrid.  The proof is valid, unless valid is
+    false, in which case the reduction encrypts m1 under the keys after its challenge instead."""
+    def names(prefix: str) -> str:
+        return "".join(f"{prefix}{j}, " for j in range(n))
+    before = "<" if valid else ">"
+    lines = HEADER + [
+        "class MultiPKE(Generic[PK, SK, CT, PT], PKEScheme[PK, SK, CT, PT]):",
+        "    @staticmethod",
+        "    def KeyGen():",
+    ] + [ f"        (pk{j}, sk{j}) = InnerPKE.KeyGen()" for j in range(n) ] + [
+        f"        return (({names('pk')}), ({names('sk')}))",
+        "    @staticmethod",
+        "    def Encrypt(pk, msg):",
+        f"        ({names('pk')}) = pk",
+    ] + [ f"        ct{j} = InnerPKE.Encrypt(pk{j}, msg)" for j in range(n) ] + [
+        f"        return ({names('ct')})",
+        "    @staticmethod",
+        "    def Decrypt(sk, ct):",
+        f"        ({names('sk')}) = sk",
+        f"        ({names('ct')}) = ct",
+        "        return InnerPKE.Decrypt(sk0, ct0)",
+        "",
+        "class MultiReduction(Crypto.Reduction, Generic[PK, SK, CT, PT], PKE.INDCPA_Adversary[PK, SK, CT, PT]):",
+    ] + REDUCTION_INIT + [
+        "    def challenge(self, pk: PK) -> Tuple[PT, PT]:",
+    ] + [ f"        (pk{j}, sk{j}) = InnerPKE.KeyGen()" for j in range(n) ] + [
+        f"        qk{j} = pk if hybrid == {j} else pk{j}" for j in range(n) ] + [
+        f"        self.pk{j} = qk{j}" for j in range(n) ] + [
+        f"        (m0, m1) = self.inner_adversary.challenge(({names('qk')}))",
+        "        self.m0 = m0",
+        "        self.m1 = m1",
+        "        return (m0, m1)",
+        "    def guess(self, ct: CT) -> Crypto.Bit:",
+    ] + [ f"        ct{j} = ct if hybrid == {j} else InnerPKE.Encrypt(self.pk{j}, self.m1 if {j} {before} hybrid else self.m0)" for j in range(n) ] + [
+        f"        r = self.inner_adversary.guess(({names('ct')}))",
+        "        return r",
+        "",
+        "def proof() -> Proof:",
+        "    proof = Proof(MultiPKE, PKE.INDCPA)",
+        f"    proof.add_hybrid_proof_step(MultiReduction, 'hybrid', {n}, PKE.INDCPA, InnerPKE, 'InnerPKE')",
+        "    return proof",
+    ]
+    return "\n".join(lines) + "\n"
+
+def load_module(source: str, directory: str, name: str) -> types.ModuleType:
+    """Writes source to the file name.py in directory and imports it as the module name, replacing any module of that
+    name.  The classes in the module must come from a file for inlining to find their source."""
+    path = os.path.join(directory, f"{name}.py")
+    with open(path, 'w') as fh:
+        fh.write(source)
+    spec = importlib.util.spec_from_file_location(name, path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -1,19 +1,20 @@
 import ast
-import copy
 import difflib
 import inspect
+import os
 import types
+import weakref
 from typing import Any, Callable, Dict, List, Optional, Type, Union, TypeVar
 from typing import _GenericAlias # type: ignore
 
 from . import node_traverser as nt
 
+def string_diff(a: str, b: str) -> str:
+    """Returns the line by line diff of a and b, as made by difflib.ndiff."""
+    return ''.join(difflib.ndiff(a.splitlines(keepends=True), b.splitlines(keepends=True)))
+
 def stringDiff(a,b):
-    differences = difflib.ndiff(a.splitlines(keepends=True), b.splitlines(keepends=True))
-    diffl = []
-    for difference in differences:
-        diffl.append(difference)
-    print(''.join(diffl), end="\n")
+    print(string_diff(a, b), end="\n")
 
 class NewNodeVisitor(ast.NodeVisitor):
     """Adds the ability to handle List[ast.stmt] to ast.NodeVistor"""
@@ -30,6 +31,21 @@ class NewNodeVisitor(ast.NodeVisitor):
             super().visit(node)
 
 S = TypeVar('S', bound=ast.AST)
+def copy_ast(node: S) -> S:
+    """Returns a deep copy of an AST.  This is much faster than copy.deepcopy, which goes through the generic copy protocol
+    and keeps a memo of every object copied.  Nodes without fields (contexts such as ast.Load and operators such as ast.Add)
+    cannot be modified, so they are shared between the copies, just like ast.parse shares them."""
+    return _copy_ast_value(node)
+
+def _copy_ast_value(value):
+    if isinstance(value, ast.AST):
+        if not value._fields: return value
+        ret = ast.AST.__new__(type(value))
+        ret.__dict__.update({ name: _copy_ast_value(v) for name, v in value.__dict__.items() })
+        return ret
+    if isinstance(value, list): return [ _copy_ast_value(v) for v in value ]
+    return value
+
 def rename_variables(node: S, mapping: dict, error_if_exists = True) -> S:
     for n in nt.nodes(node, nodetype = ast.Name):
         assert(isinstance(n, ast.Name))
@@ -51,6 +67,21 @@ def rename_function_body_variables(f: ast.FunctionDef, mapping: dict, error_if_e
             arg.arg = mapping[arg.arg]
     return f
 
+def substitute_function_body_variables(f: ast.FunctionDef, mapping: Dict[str, str]) -> ast.FunctionDef:
+    """Modifies, in place, all the variables in the given function definition renamed based on the provided mapping,
+    like rename_function_body_variables, but simultaneously and in a single traversal: a variable can be renamed to the
+    old name of another one that is renamed too (so mapping can, e.g., swap two names).  Raises a ValueError if a new
+    name is already used in the function by a variable that is not renamed."""
+    new_names = set(mapping.values())
+    for n in nt.nodes(f, nodetype = ast.Name):
+        assert(isinstance(n, ast.Name))
+        if n.id in mapping: n.id = mapping[n.id]
+        elif n.id in new_names: raise ValueError("New name '{:s}' already exists in function".format(n.id))
+    for arg in f.args.args:
+        if arg.arg in mapping: arg.arg = mapping[arg.arg]
+        elif arg.arg in new_names: raise ValueError("New name '{:s}' already exists in function".format(arg.arg))
+    return f
+
 class NamePrefixer(nt.NodeTraverser):
     def __init__(self, prefix: str):
         self.prefix = prefix
@@ -121,7 +152,7 @@ def vars_depends_on(node: Optional[ast.AST]) -> List[str]:
             return node.arg
         return None
 
-    return nt.bits.glue_list_and_vals([ node_deps(n) for n in nt.nodes(node) ])
+    return nt.bits.glue_list_and_vals([ node_deps(n) for n in nt.nodes(node, nodetype = (ast.Name, ast.Attribute, ast.arg)) ])
 
 def vars_assigns_to(node: Union[ast.AST, List[ast.stmt]]) -> List[str]:
     # TODO: this is not correct if assign happens in an inner scope
@@ -134,7 +165,7 @@ def vars_assigns_to(node: Union[ast.AST, List[ast.stmt]]) -> List[str]:
                 return vars_depends_on(node.value)
         return None
 
-    return nt.bits.glue_list_and_vals([ node_assigns(n) for n in nt.nodes(node) ])
+    return nt.bits.glue_list_and_vals([ node_assigns(n) for n in nt.nodes(node, nodetype = (ast.Name, ast.Attribute)) ])
 
 def remove_indentation(src: str) -> str:
     indentation = 0
@@ -144,12 +175,53 @@ def remove_indentation(src: str) -> str:
         newsrc.append(line[indentation:])
     return "\n".join(newsrc)
 
+def source_mtime(o: Any) -> Optional[float]:
+    """Returns the modification time of the file containing the source of a class or function, or None if there is no such file."""
+    try:
+        path = inspect.getsourcefile(o)
+        return os.path.getmtime(path) if path else None
+    except (TypeError, OSError):
+        return None
+
+class ParseCache():
+    """Cache of the definitions parsed by get_function_def and get_class_def from functions and classes (not strings).
+    Entries are keyed by the function or class object (without keeping it alive) and record the modification time of its
+    source file, so that the definition is parsed again if the file changes.  The cached definitions are never returned
+    themselves, only copies, so callers are free to modify what they get.  hits and misses count the lookups."""
+    def __init__(self):
+        self.entries: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, o: Any) -> ast.stmt:
+        """Returns a copy of the parsed definition of a class or function."""
+        mtime = source_mtime(o)
+        entry = self.entries.get(o)
+        if entry is not None and entry[0] == mtime:
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = (mtime, ast.parse(remove_indentation(inspect.getsource(o))).body[0])
+            self.entries[o] = entry
+        return copy_ast(entry[1])
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+parse_cache = ParseCache()
+
 def get_function_def(f: Union[Callable, str, ast.FunctionDef]) -> ast.FunctionDef:
-    """Gets the ast.FunctionDef for a function that is given as a function or as a string."""
+    """Gets the ast.FunctionDef for a function that is given as a function or as a string.
+    Functions are only parsed once (see ParseCache)."""
     # parse the function
-    if isinstance(f, types.FunctionType): t = ast.parse(remove_indentation(inspect.getsource(f)))
+    if isinstance(f, types.FunctionType):
+        fdef = parse_cache.get(f)
+        assert isinstance(fdef, ast.FunctionDef)
+        return fdef
     elif isinstance(f, str): t = ast.parse(remove_indentation(f))
-    elif isinstance(f, ast.FunctionDef): return copy.deepcopy(f)
+    elif isinstance(f, ast.FunctionDef): return copy_ast(f)
     else: raise TypeError("Cannot handle functions provided as {:s}".format(type(f).__name__))
     # get the function definition
     fdef = t.body[0]
@@ -157,11 +229,15 @@ def get_function_def(f: Union[Callable, str, ast.FunctionDef]) -> ast.FunctionDe
     return fdef
 
 def get_class_def(c: Union[Type[Any], str, ast.ClassDef]) -> ast.ClassDef:
-    """Gets the ast.ClassDef for a class that is given as a class or as a string."""
+    """Gets the ast.ClassDef for a class that is given as a class or as a string.
+    Classes are only parsed once (see ParseCache)."""
     # parse the function
     if isinstance(c, str): t = ast.parse(remove_indentation(c))
-    elif isinstance(c, ast.ClassDef): return copy.deepcopy(c)
-    elif inspect.isclass(c): t = ast.parse(remove_indentation(inspect.getsource(c)))
+    elif isinstance(c, ast.ClassDef): return copy_ast(c)
+    elif inspect.isclass(c):
+        cdef = parse_cache.get(c)
+        assert isinstance(cdef, ast.ClassDef)
+        return cdef
     else: raise TypeError("Cannot handle classes provided as {:s}".format(type(c).__name__))
     # get the class definition
     cdef = t.body[0]
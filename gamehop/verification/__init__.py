@@ -1,10 +1,12 @@
 import ast
 import copy
+import hashlib
 import inspect
 import random
 import re
+import time
 
-from typing import Any, Callable, Dict, List, Set, Type, Union
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Type, Union
 from types import FunctionType
 
 from . import canonicalization
@@ -13,6 +15,27 @@ from .canonicalization import expand
 from .canonicalization import simplify
 from .canonicalization import ifstatements
 from .canonicalization.classes import unnecessary_members
+from .pass_manager import PassManager, add_counts
+from .profile import Profile, count_nodes, profiled
+
+class CanonicalForm(NamedTuple):
+    """The canonicalization of a game or function: its source, and its fingerprint (see fingerprint).  Two
+    canonicalizations are equal exactly when their fingerprints are, so the fingerprint is what is compared and
+    stored; the source is only needed to show the canonicalization or a diff."""
+    fingerprint: str
+    source: str
+
+def fingerprint(source: str) -> str:
+    """Returns the fingerprint of the unparsed code of a canonicalized game or function: a 128-bit BLAKE2 digest, which
+    is the same in every process and Python session.  The unparsed code is hashed rather than the AST itself so that
+    ASTs that differ only in ways the unparsed code does not show (e.g. a negative constant made by simplify and the
+    unary minus of a parsed one) have equal fingerprints, as canonicalizations are equal when their code is."""
+    return hashlib.blake2b(source.encode("utf-8"), digest_size = 16).hexdigest()
+
+def canonical_form(x: ast.AST) -> CanonicalForm:
+    """Returns the CanonicalForm of a canonicalized game or function, given as its AST."""
+    source = ast.unparse(ast.fix_missing_locations(x))
+    return CanonicalForm(fingerprint(source), source)
 
 def debug_helper(x, label):
     if False: # change this to True to print some debugging info
@@ -20,80 +43,182 @@ def debug_helper(x, label):
         print("after {:s}".format(label))
         print(ast.unparse(x))
 
-def canonicalize_function(f: Union[Callable, str]) -> str:
-    """Returns a string representing a canonicalized version of the given function.
+def check_fixpoint(x: ast.AST, changed: bool, str_previous: str) -> str:
+    """Debugging cross-check for the canonicalization loops: raises an AssertionError if the passes of a
+    round reported no change but the unparsed code is different from that of the previous round, or if
+    they reported a change but the unparsed code is the same (passes undoing each other, which would
+    otherwise loop forever).  Returns the unparsed code for use in the next round."""
+    str_current = ast.unparse(ast.fix_missing_locations(x))
+    if not changed and str_current != str_previous:
+        raise AssertionError("Canonicalization passes reported no change but the code changed from\n{:s}\nto\n{:s}".format(str_previous, str_current))
+    if changed and str_current == str_previous:
+        raise AssertionError("Canonicalization passes reported a change but the code is still\n{:s}".format(str_current))
+    return str_current
+
+# Passes that restructure the code can give any pass new work to do.  The others only rename or reorder:
+# - the name of the function is not looked at by any pass, and renaming variables consistently does not
+#   change what any pass does;
+# - reordering or removing arguments changes the order in which variables are first used;
+# - reordering lines and removing unused ones can leave assignments that can be collapsed and arguments that
+#   are not used, and changes the order in which variables are first used.
+STRUCTURAL_PASSES = [
+    'inline_lambdas',
+    'if_statements_to_expressions',
+    'expand_non_compact_expressions',
+    'collapse_useless_assigns',
+    'simplify',
+]
+PASS_ENABLES: Dict[str, List[str]] = {
+    **{ name: STRUCTURAL_PASSES + ['canonicalize_line_order', 'canonicalize_argument_order', 'canonicalize_variable_names'] for name in STRUCTURAL_PASSES },
+    'canonicalize_function_name': [],
+    'canonicalize_line_order': ['collapse_useless_assigns', 'canonicalize_argument_order', 'canonicalize_variable_names'],
+    'canonicalize_argument_order': ['canonicalize_variable_names'],
+    'canonicalize_variable_names': [],
+}
+
+def with_debug_helper(canonicalization_pass: Callable[[ast.FunctionDef], bool], label: str) -> Callable[[ast.FunctionDef], bool]:
+    def run(f: ast.FunctionDef) -> bool:
+        changed = canonicalization_pass(f)
+        debug_helper(f, label)
+        return changed
+    return run
+
+def function_passes(extra_dependencies: Dict[str, List[str]]) -> List[Tuple[str, Callable[[ast.FunctionDef], bool]]]:
+    """The passes of canonicalize_function, in the order they are run.  extra_dependencies is passed to
+    canonicalize_line_order; it can be updated in place between rounds."""
+    return [
+        # Inline lambdas first so that the inlined expression will be expanded later
+        ('inline_lambdas', with_debug_helper(canonicalization.inline_lambdas, "canonicalization.inline_lambdas")),
+        ('if_statements_to_expressions', with_debug_helper(ifstatements.if_statements_to_expressions, "ifstatements.if_statements_to_expressions")),
+        ('expand_non_compact_expressions', with_debug_helper(lambda f: expand.expand_non_compact_expressions(f, compact_tuples = True), "expand.expand_non_compact_expressions")),
+        ('canonicalize_function_name', with_debug_helper(canonicalization.canonicalize_function_name, "canonicalization.canonicalize_function_name")),
+        ('collapse_useless_assigns', with_debug_helper(canonicalization.collapse_useless_assigns, "canonicalization.collapse_useless_assigns")),
+        ('simplify', with_debug_helper(canonicalization.simplify.simplify_function, "canonicalization.simplify.simplify")),
+        ('canonicalize_line_order', with_debug_helper(lambda f: canonicalization.canonicalize_line_order(f, extra_dependencies), "canonicalization.canonicalize_line_order")),
+        ('canonicalize_argument_order', with_debug_helper(canonicalization.canonicalize_argument_order, "canonicalization.canonicalize_argument_order")),
+        ('canonicalize_variable_names', with_debug_helper(canonicalization.canonicalize_variable_names, "canonicalization.canonicalize_variable_names")),
+    ]
+
+def canonicalize_function(f: Union[Callable, str, ast.FunctionDef], debug: bool = False, pass_counts: Optional[Dict[str, int]] = None, profile: Optional[Profile] = None) -> str:
+    """Returns a string representing a canonicalized version of the given function (see canonical_function)."""
+    return canonical_function(f, debug, pass_counts, profile).source
+
+def canonical_function(f: Union[Callable, str, ast.FunctionDef], debug: bool = False, pass_counts: Optional[Dict[str, int]] = None, profile: Optional[Profile] = None) -> CanonicalForm:
+    """Returns the CanonicalForm of a canonicalized version of the given function.
 
     It applies the following canonicalizations:
     - return statements only return a single variable or a constant
     - function name is 'f'
     - variable names are 'v0', 'v1', ...
-    - lines are reordered based on variable dependencies"""
+    - lines are reordered based on variable dependencies
+
+    Each canonicalization reports whether it changed the function, and a PassManager reruns those that a
+    change could give new work to (see PASS_ENABLES) until there are none left.  If pass_counts is given, the
+    number of times each canonicalization was run is added to it.  If debug is True, the reported changes are
+    cross-checked against the unparsed code after every round, and at the end every canonicalization is run
+    once more to check that none of them still changes anything.  If profile is given, the function, its
+    rounds and each run of a canonicalization are recorded in it."""
     # parse the function
     functionDef = utils.get_function_def(f)
     assert isinstance(functionDef, ast.FunctionDef)
-    str_previous = ""
-    str_current = ast.unparse(ast.fix_missing_locations(functionDef))
-    while str_previous != str_current:
-        str_previous = str_current
-        # Inline lambdas first so that the inlined expression will be expanded later
-        canonicalization.inline_lambdas(functionDef)
-        debug_helper(functionDef, "canonicalization.inline_lambdas")
-        ifstatements.if_statements_to_expressions(functionDef)
-        debug_helper(functionDef, "ifstatements.if_statements_to_expressions")
-        expand.expand_non_compact_expressions(functionDef)
-        debug_helper(functionDef, "expand.expand_non_compact_expressions")
-        # canonicalize function name
-        canonicalization.canonicalize_function_name(functionDef)
-        debug_helper(functionDef, "canonicalization.canonicalize_function_name")
-        canonicalization.collapse_useless_assigns(functionDef)
-        debug_helper(functionDef, "canonicalization.collapse_useless_assigns")
-        canonicalization.simplify.simplify(functionDef)
-        debug_helper(functionDef, "canonicalization.simplify.simplify")
-        canonicalization.canonicalize_line_order(functionDef)
-        debug_helper(functionDef, "canonicalization.canonicalize_line_order")
-        canonicalization.canonicalize_argument_order(functionDef)
-        debug_helper(functionDef, "canonicalization.canonicalize_argument_order")
-        canonicalization.canonicalize_variable_names(functionDef)
-        debug_helper(functionDef, "canonicalization.canonicalize_variable_names")
-        str_current = ast.unparse(ast.fix_missing_locations(functionDef))
-    return str_current
+    with profiled(profile, functionDef.name, 'function') as profile_args:
+        str_previous = ast.unparse(ast.fix_missing_locations(functionDef)) if debug else ""
+        manager = PassManager(function_passes(dict()), PASS_ENABLES, profile, functionDef.name)
+        rounds = 0
+        while manager.pending():
+            rounds += 1
+            with profiled(profile, functionDef.name, 'round', round = rounds):
+                changed = manager.run_round(functionDef)
+            if debug: str_previous = check_fixpoint(functionDef, changed, str_previous)
+        if debug: manager.check_done(functionDef)
+        if pass_counts is not None: add_counts(pass_counts, manager.counts)
+        profile_args.update(rounds = rounds, nodes = count_nodes(functionDef) if profile is not None else 0)
+        return canonical_form(functionDef)
+
+def members_used_by_methods(cdef: ast.ClassDef) -> Dict[str, List[str]]:
+    """Returns, for each method of the game, the members of self it uses, keyed by "self.method"."""
+    members_in_scope: Dict[str, List[str]] = dict()
+    for f in cdef.body:
+        assert isinstance(f, ast.FunctionDef)
+        selfname = f.args.args[0].arg
+        members_in_scope[selfname + "." + f.name] = list()
+        for v in utils.vars_depends_on(f):
+            if v.startswith(selfname + "."):
+                members_in_scope[selfname + "." + f.name].append(v)
+    return members_in_scope
 
-def canonicalize_game(c: Union[Type[Any], str, ast.ClassDef]) -> str:
+def canonicalize_game(c: Union[Type[Any], str, ast.ClassDef], debug: bool = False, pass_counts: Optional[Dict[str, int]] = None, profile: Optional[Profile] = None) -> str:
+    """Returns a string representing a canonicalized version of the given game (see canonical_game)."""
+    return canonical_game(c, debug, pass_counts, profile).source
+
+def canonical_game(c: Union[Type[Any], str, ast.ClassDef], debug: bool = False, pass_counts: Optional[Dict[str, int]] = None, profile: Optional[Profile] = None) -> CanonicalForm:
+    """Returns the CanonicalForm of a canonicalized version of the given game.  The canonicalizations
+    of canonicalize_function (other than those of the name and arguments) are applied to each method,
+    and members of self that are only used in one method are made local to it.
+
+    Each method has its own PassManager, so a change to one method only reruns passes on the others if it
+    changes which members the method uses and they call it (canonicalize_line_order depends on the members
+    used by the methods called) or makes a member local.  pass_counts, debug and profile are as for canonicalize_function."""
     cdef = utils.get_class_def(c)
-    cdef.name = "G"
-    str_previous = ""
-    str_current = ast.unparse(ast.fix_missing_locations(cdef))
-    while str_previous != str_current:
-        str_previous = str_current
-        # determine which members are used within each function, so that we can pass that
-        # list of dependencies to canonicalize_line_order
-        members_in_scope: Dict[str, List[str]] = dict()
+    with profiled(profile, cdef.name, 'game') as profile_args:
+        cdef.name = "G"
         for f in cdef.body:
             if not isinstance(f, ast.FunctionDef):
                 raise ValueError(f"Cannot canonicalize games containing anything other than functions; {cdef.name} contains a node of type {type(f).__name__}")
-            selfname = f.args.args[0].arg
-            members_in_scope[selfname + "." + f.name] = list()
-            for v in utils.vars_depends_on(f):
-                if v.startswith(selfname + "."):
-                    members_in_scope[selfname + "." + f.name].append(v)
-        for i, f in enumerate(cdef.body):
-            if not isinstance(f, ast.FunctionDef):
-                raise ValueError(f"Cannot canonicalize games containing anything other than functions; {cdef.name} contains a node of type {type(f).__name__}")
-            ifstatements.if_statements_to_expressions(f)
-            debug_helper(f, "ifstatements.if_statements_to_expressions")
-            expand.expand_non_compact_expressions(f)
-            debug_helper(f, "expand.expand_non_compact_expressions")
-            canonicalization.collapse_useless_assigns(f)
-            debug_helper(f, "canonicalization.collapse_useless_assigns")
-            canonicalization.simplify.simplify(f)
-            debug_helper(f, "canonicalization.simplify.simplify")
-            if f.name != "__init__":
-                canonicalization.canonicalize_line_order(f, members_in_scope)
-                debug_helper(f, "canonicalization.canonicalize_line_order")
-            canonicalization.canonicalize_variable_names(f)
-            debug_helper(f, "canonicalization.canonicalize_variable_names")
-            cdef.body[i] = f
-        unnecessary_members(cdef)
-        debug_helper(cdef, "canonicalization.classes.unnecessary_members")
-        str_current = ast.unparse(ast.fix_missing_locations(cdef))
-    return ast.unparse(ast.fix_missing_locations(cdef))
+        str_previous = ast.unparse(ast.fix_missing_locations(cdef)) if debug else ""
+        # which members are used within each function, so that we can pass that list of dependencies to
+        # canonicalize_line_order.  This is updated in place, since the passes refer to it.
+        members_in_scope: Dict[str, List[str]] = dict()
+        managers = list()
+        for f in cdef.body:
+            skipped = ['canonicalize_function_name', 'canonicalize_argument_order', 'inline_lambdas']
+            if f.name == "__init__": skipped.append('canonicalize_line_order')
+            managers.append(PassManager([p for p in function_passes(members_in_scope) if p[0] not in skipped], PASS_ENABLES, profile, f.name))
+        class_counts = { 'unnecessary_members': 0 }
+        unnecessary_members_scheduled = True
+        rounds = 0
+        while unnecessary_members_scheduled or any(manager.pending() for manager in managers):
+            rounds += 1
+            with profiled(profile, cdef.name, 'round', round = rounds):
+                changed = False
+                new_members_in_scope = members_used_by_methods(cdef)
+                if new_members_in_scope != members_in_scope:
+                    # the line order of a method only depends on the members used by the methods it loads
+                    changed_methods = { m for m in members_in_scope.keys() | new_members_in_scope.keys() if members_in_scope.get(m) != new_members_in_scope.get(m) }
+                    members_in_scope.clear()
+                    members_in_scope.update(new_members_in_scope)
+                    for f, manager in zip(cdef.body, managers):
+                        if any(v in changed_methods for v in members_in_scope[f.args.args[0].arg + "." + f.name]):
+                            manager.schedule(['canonicalize_line_order'])
+                for f, manager in zip(cdef.body, managers):
+                    if manager.run_round(f):
+                        changed = True
+                        unnecessary_members_scheduled = True
+                if unnecessary_members_scheduled:
+                    unnecessary_members_scheduled = False
+                    class_counts['unnecessary_members'] += 1
+                    start = time.perf_counter()
+                    members_changed = unnecessary_members(cdef)
+                    if profile is not None: profile.record('unnecessary_members', 'pass', start, time.perf_counter(), function = cdef.name, changed = members_changed, nodes = count_nodes(cdef))
+                    if members_changed:
+                        changed = True
+                        for manager in managers: manager.schedule(PASS_ENABLES)
+                    debug_helper(cdef, "canonicalization.classes.unnecessary_members")
+            if debug: str_previous = check_fixpoint(cdef, changed, str_previous)
+        if debug:
+            for f, manager in zip(cdef.body, managers): manager.check_done(f)
+            if unnecessary_members(cdef): raise AssertionError("Canonicalization pass unnecessary_members still changed the code after it was no longer scheduled")
+        if pass_counts is not None:
+            for manager in managers: add_counts(pass_counts, manager.counts)
+            add_counts(pass_counts, class_counts)
+        profile_args.update(rounds = rounds, nodes = count_nodes(cdef) if profile is not None else 0)
+        return canonical_form(cdef)
+
+def canonical_fingerprint(x: Union[Callable, Type[Any], str, ast.FunctionDef, ast.ClassDef], profile: Optional[Profile] = None) -> str:
+    """Returns the fingerprint of the canonicalization of a game or function (see fingerprint), given as for
+    canonical_game or canonical_function.  Games and functions are canonicalized equally exactly when their
+    fingerprints are equal."""
+    if isinstance(x, str): x = ast.parse(utils.remove_indentation(x)).body[0]
+    if inspect.isclass(x) or isinstance(x, ast.ClassDef):
+        return canonical_game(x, profile = profile).fingerprint
+    return canonical_function(x, profile = profile).fingerprint
@@ -0,0 +1,115 @@
+import ast
+import functools
+import hashlib
+import os
+import sqlite3
+from typing import Any, Optional, Type, Union
+
+from .. import utils
+from . import CanonicalForm, canonical_game
+from .profile import Profile
+
+@functools.lru_cache(maxsize=None)
+def code_version() -> str:
+    """Returns a hash of the source code of the gamehop package.  gamehop has no release version, so this is
+    used in cache keys to make sure that canonicalizations computed by a different version of the code are never reused."""
+    h = hashlib.sha256()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.endswith(".py"): continue
+            path = os.path.join(dirpath, filename)
+            h.update(os.path.relpath(path, root).encode("utf-8"))
+            with open(path, "rb") as fh:
+                h.update(fh.read())
+    return h.hexdigest()
+
+def cache_key(c: Union[Type[Any], str, ast.ClassDef]) -> str:
+    """Returns the cache key of a game: a hash of its unparsed source together with the gamehop code version."""
+    src = ast.unparse(utils.get_class_def(c))
+    return hashlib.sha256((code_version() + "\n" + src).encode("utf-8")).hexdigest()
+
+class CanonicalizationCache():
+    """Persistent cache of canonical_game results, stored in an sqlite file.
+    Entries are keyed by cache_key() and hold the fingerprint of the canonicalization as well as its source.  Each entry records the value of a use counter, stored in the file and
+    incremented on every get and put; when there are more than max_entries entries, the least recently used
+    ones are evicted.  The connection is opened lazily and not pickled, so a cache can be sent to worker processes.
+    hits and misses count the lookups made through this object only; a copy sent to another process counts its
+    own (Proof.check adds those of its workers back into its cache)."""
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if os.path.dirname(self.path): os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            # the canonical table of files made before fingerprints were stored only holds entries of older code versions
+            self._connection.execute("DROP TABLE IF EXISTS canonical")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS canonical_forms (key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, canonical TEXT NOT NULL, last_used INTEGER NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS canonical_forms_last_used ON canonical_forms (last_used)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS clock (tick INTEGER NOT NULL)")
+            self._connection.execute("INSERT INTO clock (tick) SELECT 0 WHERE NOT EXISTS (SELECT * FROM clock)")
+            self._connection.commit()
+        return self._connection
+
+    def tick(self) -> int:
+        """Increments the use counter and returns its new value.  This happens inside the caller's transaction,
+        so concurrent processes sharing the file get distinct values."""
+        con = self.connection()
+        con.execute("UPDATE clock SET tick = tick + 1")
+        return con.execute("SELECT tick FROM clock").fetchone()[0]
+
+    def get(self, key: str) -> Optional[CanonicalForm]:
+        """Returns the canonicalization stored for key, or None if there is none, marking the entry as recently used."""
+        con = self.connection()
+        row = con.execute("SELECT fingerprint, canonical FROM canonical_forms WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        con.execute("UPDATE canonical_forms SET last_used = ? WHERE key = ?", (self.tick(), key))
+        con.commit()
+        return CanonicalForm(*row)
+
+    def put(self, key: str, canonical: CanonicalForm) -> None:
+        """Stores the canonicalization for key, then evicts least recently used entries beyond max_entries."""
+        con = self.connection()
+        con.execute("INSERT OR REPLACE INTO canonical_forms (key, fingerprint, canonical, last_used) VALUES (?, ?, ?, ?)", (key, canonical.fingerprint, canonical.source, self.tick()))
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            con.execute("DELETE FROM canonical_forms WHERE key IN (SELECT key FROM canonical_forms ORDER BY last_used LIMIT ?)", (excess,))
+        con.commit()
+
+    def __len__(self) -> int:
+        return self.connection().execute("SELECT COUNT(*) FROM canonical_forms").fetchone()[0]
+
+    def canonicalize_game(self, c: Union[Type[Any], str, ast.ClassDef], profile: Optional[Profile] = None) -> str:
+        """Same as verification.canonicalize_game, but returns the cached result if there is one."""
+        return self.canonical_game(c, profile).source
+
+    def canonical_game(self, c: Union[Type[Any], str, ast.ClassDef], profile: Optional[Profile] = None) -> CanonicalForm:
+        """Same as verification.canonical_game, but returns the cached result if there is one."""
+        # parse the game only once, for both the key and the canonicalization
+        cdef = utils.get_class_def(c)
+        key = cache_key(cdef)
+        canonical = self.get(key)
+        if canonical is None:
+            canonical = canonical_game(cdef, profile = profile)
+            self.put(key, canonical)
+        return canonical
+
+def default_cache() -> Optional[CanonicalizationCache]:
+    """Returns the cache in the directory named by the GAMEHOP_CACHE_DIR environment variable, or None if it is not set."""
+    cache_dir = os.environ.get("GAMEHOP_CACHE_DIR")
+    if not cache_dir: return None
+    return CanonicalizationCache(os.path.join(cache_dir, "canonical.sqlite"))
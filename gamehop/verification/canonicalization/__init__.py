@@ -1,6 +1,4 @@
 import ast
-import copy
-import secrets
 from typing import Dict, List, Union
 
 from ...inlining import internal
@@ -9,26 +7,21 @@ from ... import node_traverser as nt
 from ... import node_graph as ng
 from ... import bits 
 
-def canonicalize_function_name(f: ast.FunctionDef, name = 'f') -> None:
-    """Modify (in place) the given function definition to have a canonical name."""
+def canonicalize_function_name(f: ast.FunctionDef, name = 'f') -> bool:
+    """Modify (in place) the given function definition to have a canonical name.  Returns True if the name changed."""
+    changed = f.name != name
     f.name = name
     ast.fix_missing_locations(f)
+    return changed
 
-def canonicalize_variable_names(f: ast.FunctionDef, prefix = 'v') -> None:
-    """Modify (in place) the given function definition to give variables canonical names."""
-    # first rename everything to a random string followed by a counter
-    # then rename them to v0, v1, v2, ...
-    tmpname = 'tmp_' + secrets.token_hex(10)
-    # set up the mappings
+def canonicalize_variable_names(f: ast.FunctionDef, prefix = 'v') -> bool:
+    """Modify (in place) the given function definition to give variables canonical names.  Returns True if any variable was renamed."""
+    # rename all the variables at once, so that no temporary names are needed even if some new names are old names of
+    # other variables
     vars = internal.find_all_variables(f)
-    mappings_1stpass = dict()
-    mappings_2ndpass = dict()
-    for i in range(len(vars)):
-        mappings_1stpass[vars[i]] = '{:s}{:d}'.format(tmpname, i)
-        mappings_2ndpass[mappings_1stpass[vars[i]]] = '{:s}{:d}'.format(prefix, i)
-    utils.rename_function_body_variables(f, mappings_1stpass)
-    utils.rename_function_body_variables(f, mappings_2ndpass)
-    ast.fix_missing_locations(f)
+    mapping = { var: '{:s}{:d}'.format(prefix, i) for (i, var) in enumerate(vars) }
+    utils.substitute_function_body_variables(f, mapping)
+    return any(var != new for (var, new) in mapping.items())
 
 # apparently not used
 def contains_name(node: Union[ast.AST, List], name: str) -> bool:
@@ -47,7 +40,7 @@ class VariableCollapser(nt.NodeTraverser):
         value = self.var_value(node.id)
 
         if isinstance(value, ast.Constant) or isinstance(value, ast.Name) or isinstance(value, ast.Tuple) or isinstance(value, ast.Attribute):
-            return copy.deepcopy(value)
+            return self.replacement(node, value)
 
         return node
 
@@ -56,7 +49,7 @@ class VariableCollapser(nt.NodeTraverser):
         if not isinstance(node.ctx, ast.Load):
             return node
 
-        fqn = ".".join(bits.attribute_fqn(node))
+        fqn = bits.attribute_fqn(node).name
 
         if not self.in_scope(fqn):   # this includes cases like function names
             return node
@@ -64,16 +57,25 @@ class VariableCollapser(nt.NodeTraverser):
         value = self.var_value(fqn)
 
         if isinstance(value, ast.Constant) or isinstance(value, ast.Name) or isinstance(value, ast.Tuple) or isinstance(value, ast.Attribute):
-            return copy.deepcopy(value)
+            return self.replacement(node, value)
 
         return node
 
+    def replacement(self, node, value):
+        # Don't replace a node with a copy of itself (eg. after x = x), so that
+        # we only report a change when there really was one
+        if ast.dump(node) == ast.dump(value):
+            return node
+        return utils.copy_ast(value)
+
 
-def collapse_useless_assigns(f: ast.FunctionDef) -> None:
+def collapse_useless_assigns(f: ast.FunctionDef) -> bool:
     """Modify (in place) the given function definition to remove all lines containing tautological/useless assignments. For example, if the code contains a line "x = a" followed by a line "y = x + b", it replaces all subsequent instances of x with a, yielding the single line "y = a + b", up until x is set in another assignment statement.  Handles tuples.  Doesn't handle any kind of logic involving if statements or loops."""
 
-    VariableCollapser().visit(f)
+    collapser = VariableCollapser()
+    collapser.visit(f)
     ast.fix_missing_locations(f)
+    return collapser.changed
 
 # apparently not used
 def assignee_vars(stmt: ast.Assign) -> List[str]:
@@ -87,33 +89,41 @@ def assignee_vars(stmt: ast.Assign) -> List[str]:
         return ret
     else: raise NotImplementedError("Cannot handle assignments with left sides of the type " + str(type(stmt.targets[0]).__name__))
 
-def canonicalize_line_order(f: ast.FunctionDef, extra_dependencies: Dict[str, List[str]] = {}) -> None:
+def canonicalize_line_order(f: ast.FunctionDef, extra_dependencies: Dict[str, List[str]] = {}, bitsets: bool = False) -> bool:
     """Modify (in place) the given function definition to canonicalize the order of lines
     based on the order in which the returned variable depends on previous lines. Lines
     that do not affect the return variable are removed.  Assumes that the return statement
-    is the last statement in the function body"""
-    G = ng.Graph.from_stmts(f.body, extra_dependencies)
+    is the last statement in the function body.  Returns True if any line was moved or removed.
+    If bitsets is True, the dependency graph is made in bitset mode (see node_graph.GraphMaker); the result is the same."""
+    G = ng.Graph.from_stmts(f.body, extra_dependencies, bitsets)
     assert isinstance(f.body[-1], ast.Return)
     return_stmt = f.body[-1]
-    G = G.reachable_subgraph([ return_stmt ], True)
+    G.restrict_to_reachable([ return_stmt ], True)
     G.canonical_sort()
+    changed = len(f.body) != len(G.vertices) or any(a is not b for a, b in zip(f.body, G.vertices))
     f.body = G.vertices
+    return changed
 
 class ArgumentReorderer(nt.NodeTraverser):
     def visit_FunctionDef(self, node):
         # visit the body to get the scope set up
         node = self.generic_visit(node)
         s = self.local_scope()
-        node.args.args = [ ast.arg(arg = parname , annotation = parannotation) for parname, parannotation in s.parameters_loaded() ]
+        new_args = s.parameters_loaded()
+        if [ (a.arg, a.annotation) for a in node.args.args ] != new_args:
+            self.changed = True
+        node.args.args = [ ast.arg(arg = parname , annotation = parannotation) for parname, parannotation in new_args ]
         return node
 
-def canonicalize_argument_order(f: ast.FunctionDef) -> None:
+def canonicalize_argument_order(f: ast.FunctionDef) -> bool:
     """Modify (in place) the given function definition to canonicalize the order of the arguments
     based on the order in which the variables appear.  Arguments that are not referred to are removed.
-    Note that this also applies to any inner functions."""
+    Note that this also applies to any inner functions.  Returns True if the arguments changed."""
 
-    ArgumentReorderer().visit(f)
+    reorderer = ArgumentReorderer()
+    reorderer.visit(f)
     ast.fix_missing_locations(f)
+    return reorderer.changed
 
 class LambdaReplacer(nt.NodeTraverser):
     def visit_Call(self, node):
@@ -126,14 +136,16 @@ class LambdaReplacer(nt.NodeTraverser):
         lamargs = lam.args.args
         callargs = node.args
         assert len(lamargs) == len(callargs)
-        lambody = copy.deepcopy(lam.body)
+        lambody = utils.copy_ast(lam.body)
         mappings = dict()
         for i in range(len(lamargs)):
             mappings[lamargs[i].arg] = callargs[i]
         return utils.NameNodeReplacer(mappings).visit(lambody)
 
 
-def inline_lambdas(f: ast.FunctionDef) -> None:
-    """Modify (in place) the given function definition to replace all calls to lambdas with their body."""
-    f = LambdaReplacer().visit(f)
+def inline_lambdas(f: ast.FunctionDef) -> bool:
+    """Modify (in place) the given function definition to replace all calls to lambdas with their body.  Returns True if any call was replaced."""
+    replacer = LambdaReplacer()
+    f = replacer.visit(f)
     ast.fix_missing_locations(f)
+    return replacer.changed
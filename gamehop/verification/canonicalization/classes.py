@@ -13,7 +13,10 @@ class MembersUsedInMethod(nt.NodeTraverser):
         s = self.local_scope()
         return [a for a in s.variables[selfname].attributes]
 
-def unnecessary_members(c: ast.ClassDef) -> None:
+def unnecessary_members(c: ast.ClassDef) -> bool:
+    """Modify (in place) the given class definition so that members of self that are only used within
+    a single method become local variables of that method.  Returns True if any member was replaced."""
+    changed = False
     selfattributes = dict()
     for fdef in c.body:
         if not isinstance(fdef, ast.FunctionDef): continue
@@ -28,6 +31,9 @@ def unnecessary_members(c: ast.ClassDef) -> None:
                 if a in selfattributes[fdefprime]: a_used_elsewhere = True
             if not(a_used_elsewhere):
                 selfname = fdef.args.args[0].arg
-                fdefnew = utils.AttributeNodeReplacer([selfname, a], f"self_{a}").visit(fdef)
+                replacer = utils.AttributeNodeReplacer([selfname, a], f"self_{a}")
+                fdefnew = replacer.visit(fdef)
                 fdef.body = fdefnew.body
+                changed |= replacer.changed
     ast.fix_missing_locations(c)
+    return changed
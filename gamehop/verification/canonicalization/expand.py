@@ -1,6 +1,13 @@
 import ast
 from ... import node_traverser as nt
 
+def is_compact(node: ast.AST, compact_tuples: bool = False) -> bool:
+    """Constants, variable names and attributes are compact.  If compact_tuples is True, then so
+    are tuples of compact values."""
+    if compact_tuples and isinstance(node, ast.Tuple):
+        return all(is_compact(e, compact_tuples) for e in node.elts)
+    return isinstance(node, ast.Constant) or isinstance(node, ast.Name) or isinstance(node, ast.Attribute)
+
 class ExpandNonCompactExpressions(nt.NodeTraverser):
     # class variable
     valid_expression_containers = {
@@ -8,6 +15,10 @@ class ExpandNonCompactExpressions(nt.NodeTraverser):
         ast.Expr,       # bare function calls and expressions as statements
         ast.Lambda      # we can't expand out lambda bodies
     }
+    def __init__(self, compact_tuples: bool = False, **kwargs):
+        self.compact_tuples = compact_tuples
+        super().__init__(**kwargs)
+
     def value_to_name(self, node):
         # create a new assign statement to capture the value
         newvar = self.unique_variable_name()
@@ -24,9 +35,7 @@ class ExpandNonCompactExpressions(nt.NodeTraverser):
         newval = self.generic_visit(node) # fix up children first
 
         # Keep  statements and compact values intact
-        if (isinstance(newval, ast.Constant) or 
-                isinstance(newval, ast.Name) or
-                isinstance(newval, ast.Attribute)):
+        if is_compact(newval, self.compact_tuples):
             return newval
         # At this point node must be an expression so newval will be too
 
@@ -37,11 +46,17 @@ class ExpandNonCompactExpressions(nt.NodeTraverser):
         return self.value_to_name(newval)
 
 
-def expand_non_compact_expressions(f: ast.FunctionDef) -> None:
+def expand_non_compact_expressions(f: ast.FunctionDef, compact_tuples: bool = False) -> bool:
     """Modify (in place) the given function definition so that all non-compact
     (not a constant, not a variable name, not an attribute) expressions appear as assignments or
     as a statement (in an Expr).  New assignments to intermediate values are
-    created if necessary to make this so."""
+    created if necessary to make this so.  Returns True if any expression was expanded.
+
+    If compact_tuples is True, tuples of compact values are also left in place.  The canonicalization
+    loops need this: collapse_useless_assigns substitutes such tuples straight back, so expanding them
+    would report a change every round without the code ever changing."""
 
-    f.body = ExpandNonCompactExpressions(var_format = "φ{:d}").visit_statements(f.body)
+    expander = ExpandNonCompactExpressions(compact_tuples = compact_tuples, var_format = "φ{:d}")
+    f.body = expander.visit_statements(f.body)
     ast.fix_missing_locations(f)
+    return expander.changed
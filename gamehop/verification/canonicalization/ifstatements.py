@@ -6,7 +6,7 @@ from ... import filterast
 from ... import node_traverser as nt
 
 
-def if_statements_to_expressions(f: ast.FunctionDef ) -> None:
+def if_statements_to_expressions(f: ast.FunctionDef ) -> bool:
     """Modify, in place, f so that all if statements become if expressions like so:
     if condition:
         v = expression1
@@ -33,12 +33,15 @@ def if_statements_to_expressions(f: ast.FunctionDef ) -> None:
     v = v_if if x >= 0 else v_else
 
     so that now the math.sqrt(x) is run even if x < 0, resulting in an exception.
+
+    Returns True if any if statement was replaced.
     """
     filterast.filter_AST(f.body, noifs=False)
     iftransformer = IfTransformer()
     iftransformer.visit_statements(f.body)
     ast.fix_missing_locations(f)
     filterast.filter_AST(f.body, noifs=True)
+    return iftransformer.changed
 
 class IfTransformer(nt.NodeTraverser):
     def __init__(self):
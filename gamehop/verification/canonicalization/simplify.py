@@ -175,3 +175,11 @@ def simplify(f: ast.stmt) -> ast.stmt:
     f = NodeSimplifier().visit(f)
     ast.fix_missing_locations(f)
     return f
+
+def simplify_function(f: ast.FunctionDef) -> bool:
+    """Modify (in place) the given function definition like simplify(), returning True if
+    anything was simplified."""
+    simplifier = NodeSimplifier()
+    simplifier.visit(f)
+    ast.fix_missing_locations(f)
+    return simplifier.changed
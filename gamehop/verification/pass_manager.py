@@ -0,0 +1,63 @@
+import ast
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .profile import Profile, count_nodes
+
+class PassManager():
+    """Schedules canonicalization passes on one node (a function or a class) until none of them has anything left to do.
+
+    Passes are run in rounds in the order given, just like repeating all of them until none reports a change, but a
+    pass is only run if it is scheduled.  Initially every pass is scheduled.  When a pass reports a change, the passes
+    it enables are scheduled: in the current round if they come later in the order, otherwise in the next round.
+    enables must over-approximate which passes a change can give new work to: if a pass is not enabled by any change
+    since it last ran, it must be safe to assume that running it again would not change anything.  Since skipped passes
+    would not have changed anything, the result is the same as that of the fixed round-robin.
+
+    counts records the number of times each pass was run.  If profile is given, each run is recorded in it as a
+    span of category 'pass', labelled with function_name."""
+    def __init__(self, passes: List[Tuple[str, Callable[[ast.AST], bool]]], enables: Dict[str, Iterable[str]], profile: Optional[Profile] = None, function_name: str = ""):
+        self.passes = passes
+        self.enables = enables
+        self.profile = profile
+        self.function_name = function_name
+        self.counts: Dict[str, int] = { name: 0 for (name, _) in passes }
+        self.scheduled = { name for (name, _) in passes }
+
+    def schedule(self, names: Iterable[str]) -> None:
+        """Schedules the named passes, ignoring names of passes that this manager does not run."""
+        self.scheduled.update(name for name in names if name in self.counts)
+
+    def pending(self) -> bool:
+        return len(self.scheduled) > 0
+
+    def run_round(self, node: ast.AST) -> bool:
+        """Runs each scheduled pass once, in order, on node.  Returns True if any of them changed it."""
+        changed = False
+        for (name, canonicalization_pass) in self.passes:
+            if name not in self.scheduled: continue
+            self.scheduled.remove(name)
+            self.counts[name] += 1
+            if self.profile is None:
+                pass_changed = canonicalization_pass(node)
+            else:
+                start = time.perf_counter()
+                pass_changed = canonicalization_pass(node)
+                end = time.perf_counter()
+                self.profile.record(name, 'pass', start, end, function = self.function_name, changed = pass_changed, nodes = count_nodes(node))
+            if pass_changed:
+                changed = True
+                self.schedule(self.enables.get(name, []))
+        return changed
+
+    def check_done(self, node: ast.AST) -> None:
+        """Debugging cross-check of enables: runs every pass once more (without counting it) and raises an
+        AssertionError if any of them changes node."""
+        for (name, canonicalization_pass) in self.passes:
+            if canonicalization_pass(node):
+                raise AssertionError("Canonicalization pass {:s} still changed the code after it was no longer scheduled:\n{:s}".format(name, ast.unparse(node)))
+
+def add_counts(total: Dict[str, int], counts: Dict[str, int]) -> None:
+    """Adds the pass counts of one manager to total."""
+    for name, count in counts.items():
+        total[name] = total.get(name, 0) + count
@@ -0,0 +1,87 @@
+import ast
+import contextlib
+import json
+import time
+from typing import Any, ContextManager, Dict, Iterator, List, NamedTuple, Optional
+
+class Span(NamedTuple):
+    """A piece of work recorded by a Profile.  start is a time.perf_counter() value; start and duration are in seconds."""
+    name: str
+    category: str
+    start: float
+    duration: float
+    args: Dict[str, Any]
+
+class PassStats():
+    """Totals over the runs of one canonicalization pass: how often it was run, how often it changed the code, the time
+    it took, and the number of AST nodes of the code it ran on (counted after each run)."""
+    def __init__(self):
+        self.runs = 0
+        self.changes = 0
+        self.seconds = 0.0
+        self.nodes = 0
+
+def count_nodes(node: ast.AST) -> int:
+    return sum(1 for _ in ast.walk(node))
+
+def profiled(profile: Optional['Profile'], name: str, category: str, **args) -> ContextManager[Dict[str, Any]]:
+    """Returns profile.span(name, category, **args), or if profile is None a context manager that only yields args."""
+    if profile is None: return contextlib.nullcontext(args)
+    return profile.span(name, category, **args)
+
+class Profile():
+    """Records what the canonicalization pipeline spends its time on, when given as the profile argument of
+    canonicalize_function, canonicalize_game or Proof.check.  Each piece of work is a Span of one of these categories:
+    - 'proof': checking a proof;
+    - 'inline': inlining one of the games of a proof (args: game number and before_hop);
+    - 'hop': canonicalizing one of the games of a proof, including cache lookups (same args);
+    - 'function' or 'game': canonicalizing a function or game (args: nodes, the AST node count of the result, and rounds);
+    - 'round': one round of passes over a function or game (args: round, counting from 1);
+    - 'pass': one run of a canonicalization pass (args: function, the method it was run on, changed and nodes, the
+      AST node count after the pass).
+    Spans are recorded when they end, so inner spans come before outer ones.  Counting nodes is not included in the
+    duration of passes."""
+    def __init__(self):
+        self.spans: List[Span] = list()
+
+    def record(self, name: str, category: str, start: float, end: float, **args) -> None:
+        self.spans.append(Span(name, category, start, end - start, args))
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, **args) -> Iterator[Dict[str, Any]]:
+        """Context manager recording a span around its body.  Yields the args of the span, which the body can add to."""
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(name, category, start, time.perf_counter(), **args)
+
+    def pass_stats(self) -> Dict[str, PassStats]:
+        """Returns the totals for each pass, by name."""
+        ret: Dict[str, PassStats] = dict()
+        for span in self.spans:
+            if span.category != 'pass': continue
+            stats = ret.setdefault(span.name, PassStats())
+            stats.runs += 1
+            stats.changes += 1 if span.args['changed'] else 0
+            stats.seconds += span.duration
+            stats.nodes += span.args['nodes']
+        return ret
+
+    def rounds(self) -> int:
+        return sum(1 for span in self.spans if span.category == 'round')
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Returns the spans in the Chrome trace event format, which can be loaded in chrome://tracing, Perfetto or speedscope."""
+        origin = min((span.start for span in self.spans), default = 0.0)
+        return {
+            'traceEvents': [
+                { 'name': span.name, 'cat': span.category, 'ph': 'X', 'ts': (span.start - origin) * 1e6, 'dur': span.duration * 1e6, 'pid': 0, 'tid': 0, 'args': span.args }
+                for span in sorted(self.spans, key = lambda span: (span.start, -span.duration))
+            ],
+            'displayTimeUnit': 'ms',
+        }
+
+    def write_chrome_trace(self, path: str) -> None:
+        with open(path, 'w') as fh:
+            json.dump(self.chrome_trace(), fh)
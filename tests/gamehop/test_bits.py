@@ -0,0 +1,23 @@
+import ast
+import unittest
+
+import gamehop.bits as bits
+
+class TestFQN(unittest.TestCase):
+    def test_interned(self):
+        fqn = bits.str_fqn("self.Scheme.Encrypt")
+        self.assertEqual(fqn, ("self", "Scheme", "Encrypt"))
+        self.assertEqual(fqn.name, "self.Scheme.Encrypt")
+        self.assertIs(bits.str_fqn("self.Scheme.Encrypt"), fqn)
+        self.assertIs(bits.parts_fqn(("self", "Scheme", "Encrypt")), fqn)
+        self.assertIs(bits.attribute_fqn(ast.parse("self.Scheme.Encrypt", mode = "eval").body), fqn)
+        self.assertEqual(bits.fqn_str(fqn), "self.Scheme.Encrypt")
+        self.assertEqual(bits.fqn_str(["a", "b"]), "a.b")
+
+    def test_parent_and_attribute_path(self):
+        fqn = bits.str_fqn("self.Scheme.Encrypt")
+        self.assertIs(fqn.parent, bits.str_fqn("self.Scheme"))
+        self.assertIs(fqn.attribute_path, bits.str_fqn("Scheme.Encrypt"))
+        self.assertIs(fqn.attribute_path.attribute_path.attribute_path, bits.EMPTY_FQN)
+        self.assertEqual(len(bits.EMPTY_FQN), 0)
+        self.assertEqual(bits.str_fqn(""), ("",))
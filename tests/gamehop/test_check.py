@@ -0,0 +1,52 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import gamehop.__main__
+from gamehop.check import check_scripts
+
+# a script that checks one proof itself and leaves another one to the runner
+SCRIPT = """
+from gamehop.primitives import PKE
+from gamehop.proofs2 import Proof
+import test_proofs2
+
+valid_proof = test_proofs2.wrapped_proof()
+assert valid_proof.check()
+invalid_proof = Proof(test_proofs2.LeakingPKE, PKE.INDCPA)
+"""
+
+class TestCheck(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.script = os.path.join(self.tmpdir.name, "proofs.py")
+        with open(self.script, "w") as fh:
+            fh.write(SCRIPT)
+        self.failing_script = os.path.join(self.tmpdir.name, "failing.py")
+        with open(self.failing_script, "w") as fh:
+            fh.write("assert False, 'not a proof'\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_check_scripts(self):
+        summary = check_scripts([self.tmpdir.name])
+        self.assertEqual([(r['script'], r['name'], r['hops'], r['valid']) for r in summary['proofs']], [
+            (self.script, 'valid_proof', 1, True),
+            (self.script, 'invalid_proof', 0, False),
+        ])
+        self.assertEqual(summary['errors'], [{ 'script': self.failing_script, 'error': 'AssertionError: not a proof' }])
+        self.assertIsNone(summary['canonicalization_cache'])
+
+    def test_main(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            status = gamehop.__main__.main(["check", "--cache-dir", self.tmpdir.name, self.script])
+        summary = json.loads(out.getvalue())
+        self.assertEqual(status, 1)
+        self.assertEqual([r['valid'] for r in summary['proofs']], [True, False])
+        # a pair of games for each hop and one more: two pairs for valid_proof, one for invalid_proof
+        self.assertEqual(summary['canonicalization_cache']['hits'] + summary['canonicalization_cache']['misses'], 6)
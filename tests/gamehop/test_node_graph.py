@@ -3,7 +3,9 @@ if __name__ == '__main__':
     sys.path.append('../../')
 
 import ast
+import random
 import unittest
+import gamehop.bits as bits
 import gamehop.utils as utils
 import gamehop.node_graph as ng
 from gamehop.node_graph import Edge as Edge
@@ -574,6 +576,148 @@ class TestNodeGraph(unittest.TestCase):
         f_node.body = G.vertices
         self.assertEqual(ast.unparse(f_node), expected_result(f_expected_result))  
 
+    def test_adjacency_matches_edges(self):
+        def f(a):
+            x = a
+            y = x + 1
+            x = y + x
+            z = x + y + x
+            return z + y
+
+        fdef = utils.get_function_def(f)
+        G = ng.Graph.from_stmts(fdef.body)
+        G.add_edge(G.vertices[3], G.vertices[2], 'x')   # duplicate edges are ignored
+        self.assertEqual(len(G.edges), len(set(G.edges)))
+        for v in G.vertices:
+            self.assertTrue(G.has_vertex(v))
+            self.assertEqual(G.in_edges(v), [ e for e in G.edges if e.head == v ])
+            self.assertEqual(G.out_edges(v), [ e for e in G.edges if e.tail == v ])
+            self.assertEqual(G.in_neighbours(v), bits.unique_elements([ e.tail for e in G.edges if e.head == v ]))
+            self.assertEqual(G.out_neighbours(v), bits.unique_elements([ e.head for e in G.edges if e.tail == v ]))
+        self.assertFalse(G.has_vertex(fdef))
+
+
+    def test_traversals_match_layered_definition(self):
+        # reference implementations: recursive DFS, and Kahn's algorithm by repeatedly taking induced subgraphs
+        def dfs(G, start_points, visited):
+            for v in start_points:
+                if v not in visited:
+                    visited.append(v)
+                    yield v
+                    for n in reversed(G.out_neighbours(v)):
+                        yield from dfs(G, [n], visited)
+        def layers(G):
+            max_vertices = G.max_vertices()
+            if max_vertices:
+                yield from max_vertices
+                yield from layers(G.induced_subgraph([ v for v in G.vertices if v not in max_vertices ]))
+        rng = random.Random(1)
+        for _ in range(50):
+            n = rng.randint(2, 30)
+            lines = [ "def f(a):" ]
+            for i in range(n):
+                args = [ f"x{rng.randrange(i)}" for _ in range(rng.randint(0, 3)) ] if i > 0 else [ "a" ]
+                lines.append(f"    x{rng.randrange(i + 1)} = g({', '.join(args)})")
+            lines.append(f"    return x{rng.randrange(n)}")
+            fdef = ast.parse("\n".join(lines)).body[0]
+            G = ng.Graph.from_stmts(fdef.body)
+            start = [ G.vertices[-1] ] + G.max_vertices()
+            self.assertEqual(list(G.depth_first_traverse(start)), list(dfs(G, start, [])))
+            self.assertEqual(list(G.topological_order_traverse()), list(layers(G)))
+
+    def test_long_chain(self):
+        # 10,000 statements each loading the previous one, so the traversals go 10,000 deep
+        n = 10000
+        G = ng.Graph()
+        stmts = [ ast.parse(f"x{i} = g(x{i - 1})").body[0] for i in range(n) ]
+        unused = ast.parse("y = g(x0)").body[0]
+        for v in stmts + [ unused ]: G.add_vertex(v)
+        for i in range(1, n): G.add_edge(stmts[i], stmts[i - 1], f"x{i - 1}")
+        G.add_edge(unused, stmts[0], "x0")
+        G.add_edge(stmts[n // 2], stmts[0], "x0:overwrite")
+
+        self.assertEqual(list(G.depth_first_traverse([ stmts[-1] ], True)), list(reversed(stmts)))
+        G2 = G.reachable_subgraph([ stmts[-1] ], True)
+        self.assertEqual(len(G2.vertices), n)
+        self.assertEqual(len(G2.edges), n)
+        G2.canonical_sort()
+        self.assertEqual(G2.vertices, stmts)
+
+    def test_restrict_to_reachable_matches_reachable_subgraph(self):
+        rng = random.Random(2)
+        for _ in range(50):
+            n = rng.randint(2, 30)
+            lines = [ "def f(a):" ]
+            for i in range(n):
+                args = [ f"x{rng.randrange(i)}" for _ in range(rng.randint(0, 3)) ] if i > 0 else [ "a" ]
+                lines.append(f"    x{rng.randrange(i + 1)} = g({', '.join(args)})")
+            lines.append(f"    return x{rng.randrange(n)}")
+            fdef = ast.parse("\n".join(lines)).body[0]
+            for omit_overwrites in [ False, True ]:
+                G = ng.Graph.from_stmts(fdef.body)
+                G2 = G.reachable_subgraph([ G.vertices[-1] ], omit_overwrites)
+                G.restrict_to_reachable([ G.vertices[-1] ], omit_overwrites)
+                self.assertEqual(G.vertices, G2.vertices)
+                self.assertEqual(G.edges, G2.edges)
+                for v in G.vertices:
+                    self.assertEqual(G.in_edges(v), G2.in_edges(v))
+                    self.assertEqual(G.out_edges(v), G2.out_edges(v))
+                G.canonical_sort()
+                G2.canonical_sort()
+                self.assertEqual(G.vertices, G2.vertices)
+
+    def assertSameGraph(self, G, G2):
+        self.assertEqual(G.vertices, G2.vertices)
+        self.assertEqual(G.edges, G2.edges)
+        for v in G.vertices:
+            self.assertEqual(G.in_edges(v), G2.in_edges(v))
+            self.assertEqual(G.out_neighbours(v), G2.out_neighbours(v))
+            self.assertEqual(G.out_neighbours(v, True), G2.out_neighbours(v, True))
+        self.assertEqual(G.inner_graphs.keys(), G2.inner_graphs.keys())
+        for v, bodies in G.inner_graphs.items():
+            for name, body_graph in bodies.items():
+                self.assertSameGraph(body_graph, G2.inner_graphs[v][name])
+
+    def test_bitsets_same_graph(self):
+        rng = random.Random(3)
+        for _ in range(50):
+            n = rng.randint(2, 30)
+            lines = [ "def f(a):" ]
+            for i in range(n):
+                args = [ f"x{rng.randrange(i)}" for _ in range(rng.randint(0, 3)) ] if i > 0 else [ "a" ]
+                line = f"x{rng.randrange(i + 1)} = g({', '.join(args)})"
+                if i > 0 and rng.random() < 0.2:
+                    lines += [ f"    if x{rng.randrange(i)}:", f"        {line}", "    else:", f"        x{rng.randrange(i + 1)} = x{rng.randrange(i)}" ]
+                else:
+                    lines.append(f"    {line}")
+            lines.append(f"    return x{rng.randrange(n)}")
+            fdef = ast.parse("\n".join(lines)).body[0]
+            G = ng.Graph.from_stmts(fdef.body)
+            G2 = ng.Graph.from_stmts(fdef.body, bitsets = True)
+            self.assertSameGraph(G, G2)
+            G.restrict_to_reachable([ G.vertices[-1] ], True)
+            G2.restrict_to_reachable([ G2.vertices[-1] ], True)
+            self.assertSameGraph(G, G2)
+            G.canonical_sort()
+            G2.canonical_sort()
+            self.assertEqual(G.vertices, G2.vertices)
+
+    def test_bitsets(self):
+        def f(a):
+            x = a
+            y = x + 1
+            x = y + x
+            return x + y
+
+        fdef = utils.get_function_def(f)
+        G = ng.Graph.from_stmts(fdef.body, bitsets = True)
+        (v0, v1, v2, v3) = G.vertices
+        self.assertEqual(G.var_ids.names_in(G.reads[v2]), [ 'x', 'y' ])
+        self.assertEqual(G.var_ids.names_in(G.writes[v2]), [ 'x' ])
+        self.assertEqual(G.loaders_of(v0, 'x'), [ v1, v2 ])
+        self.assertEqual(G.out_edges(v2), [ Edge(v2, v1, 'y'), Edge(v2, v0, 'x'), Edge(v2, v0, 'x:overwrite'), Edge(v2, v1, 'x:overwrite') ])
+        self.assertEqual(G.out_neighbours(v2, True), [ v1, v0 ])
+        self.assertEqual(G.vertices_in(G.successors[v3]), [ v1, v2 ])
 
 
 if __name__ == '__main__':
@@ -357,6 +357,21 @@ class TestNodeTraverser(unittest.TestCase):
             [ 'g', 'h', 'g', 'h' ]
        )
 
+    def test_nodes_pruned(self):
+        f_ast = ast.parse("def f(x):\n    y = g(lambda z: h(z))\n    return y")
+        node_names = [ node.id for node in nt.nodes(f_ast, nodetype = ast.Name, prune = ast.Lambda) ]
+        self.assertEqual(node_names, [ 'y', 'g', 'y' ])
+        lambdas = nt.nodes(f_ast, nodetype = ast.Lambda, prune = ast.Lambda)
+        self.assertEqual([ type(node).__name__ for node in lambdas ], [ 'Lambda' ])
+
+    def test_nodes_by_type(self):
+        f_ast = ast.parse("def f(x):\n    y = g(lambda z: h(z))\n    return y")
+        (names, args, exprs) = nt.nodes_by_type(f_ast, [ ast.Name, ast.arg, ast.expr ])
+        self.assertEqual(names, nt.nodes(f_ast, nodetype = ast.Name))
+        self.assertEqual([ node.arg for node in args ], [ 'x', 'z' ])
+        self.assertEqual(exprs, nt.nodes(f_ast, nodetype = ast.expr))
+        self.assertEqual(nt.nodes_by_type(f_ast.body[0].body, [ ast.Return ]), [ [ f_ast.body[0].body[1] ] ])
+
     def test_if_same_value(self):
         class NewNodeTester(nt.NodeTraverser):
             def visit_Call(self, node):
@@ -405,3 +420,68 @@ class TestNodeTraverser(unittest.TestCase):
 
 
 
+
+    def test_dispatch_per_subclass(self):
+        class ConstantReplacer(nt.NodeTraverser):
+            def visit_Constant(self, node):
+                return ast.Constant(node.value + 1)
+        class DoubleConstantReplacer(ConstantReplacer):
+            def visit_Constant(self, node):
+                return ast.Constant(node.value + 2)
+        class NameVisitor(ConstantReplacer):
+            def visit_Name(self, node):
+                return ast.Name(id = node.id + '_', ctx = node.ctx)
+        def f(x):
+            return x + 1
+
+        # each class must use its own handlers, whichever class visits a node type first
+        for cls, expected in [(nt.NodeTraverser, 'return x + 1'), (DoubleConstantReplacer, 'return x + 3'), (ConstantReplacer, 'return x + 2'), (NameVisitor, 'return x_ + 2'), (nt.NodeTraverser, 'return x + 1')]:
+            fdef = utils.get_function_def(f)
+            cls().visit(fdef)
+            self.assertEqual(ast.unparse(fdef.body[0]), expected)
+
+    def test_stmt_scopes_opt_in(self):
+        def f(x):
+            y = x + 1
+            return y
+        class StmtScopeRecorder(nt.NodeTraverser):
+            tracks_stmt_scopes = True
+            def __init__(self):
+                super().__init__()
+                self.loaded = list()
+            def visit_Assign(self, node):
+                node = self.generic_visit(node)
+                self.loaded.append(list(self.local_stmt_scope().external_vars))
+                return node
+
+        recorder = StmtScopeRecorder()
+        recorder.visit(utils.get_function_def(f))
+        self.assertEqual(recorder.loaded, [['x']])
+
+        traverser = nt.NodeTraverser()
+        traverser.visit(utils.get_function_def(f))
+        self.assertEqual(traverser.stmt_scopes, [])
+        with self.assertRaises(AssertionError):
+            traverser.local_stmt_scope()
+
+    def test_scope_copy_on_write(self):
+        stmt1 = ast.parse("x = 1").body[0]
+        stmt2 = ast.parse("y = x.a").body[0]
+        s = scope.Scope()
+        s.add_parameter('p')
+        s.add_var_assignment('x', stmt1, stmt1.value)
+        c = s.copy()
+        self.assertIs(c.variables['x'], s.variables['x'])
+
+        # loads modify the ObjectValue, so the scope doing the load gets its own copy
+        s.add_var_load('x.a', stmt2)
+        s.add_var_load('p', stmt2)
+        self.assertIsNot(c.variables['x'], s.variables['x'])
+        self.assertEqual(s.var_modifiers('x'), [stmt1])
+        self.assertEqual(c.variables['x'].loader_stmts(), [])
+        self.assertEqual(s.variables['x'].loader_stmts(), [stmt2, stmt2])
+        self.assertEqual(s.parameters_loaded(), [('p', None)])
+
+        c.add_var_assignment('x.a', stmt2, None)
+        self.assertEqual(c.var_modifiers('x'), [stmt1, stmt2])
+        self.assertEqual(s.var_modifiers('x'), [stmt1])
@@ -0,0 +1,223 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from typing import Generic, Tuple, Type, TypeVar
+
+from gamehop.primitives import Crypto, PKE
+from gamehop.primitives.PKE import PKEScheme
+from gamehop.proofs2 import HybridProofStep, Proof
+from gamehop.synthetic import hybrid_module, load_module
+from gamehop.verification.cache import CanonicalizationCache
+from gamehop.verification.profile import Profile
+
+PK = TypeVar('PK')
+SK = TypeVar('SK')
+CT = TypeVar('CT')
+PT = TypeVar('PT')
+
+class IgnoringPKE(Generic[PK, SK, CT, PT], PKEScheme[PK, SK, CT, PT]):
+    @staticmethod
+    def KeyGen():
+        pk = Crypto.UniformlySample(PK)
+        sk = pk
+        return (pk, sk)
+    @staticmethod
+    def Encrypt(pk, msg):
+        return pk
+    @staticmethod
+    def Decrypt(sk, ct):
+        return None
+
+class LeakingPKE(Generic[PK, SK, CT, PT], PKEScheme[PK, SK, CT, PT]):
+    @staticmethod
+    def KeyGen():
+        pk = Crypto.UniformlySample(PK)
+        sk = pk
+        return (pk, sk)
+    @staticmethod
+    def Encrypt(pk, msg):
+        return msg
+    @staticmethod
+    def Decrypt(sk, ct):
+        return ct
+
+InnerPKE = PKEScheme[PK, SK, CT, PT]
+
+class WrappedPKE(Generic[PK, SK, CT, PT], PKEScheme[PK, SK, CT, PT]):
+    @staticmethod
+    def KeyGen():
+        return InnerPKE.KeyGen()
+    @staticmethod
+    def Encrypt(pk, msg):
+        return InnerPKE.Encrypt(pk, msg)
+    @staticmethod
+    def Decrypt(sk, ct):
+        return InnerPKE.Decrypt(sk, ct)
+
+class R(Crypto.Reduction, Generic[PK, SK, CT, PT], PKE.INDCPA_Adversary[PK, SK, CT, PT]):
+    def __init__(self, Scheme: Type[PKEScheme[PK, SK, CT, PT]], inner_adversary: PKE.INDCPA_Adversary[PK, SK, CT, PT]):
+        self.Scheme = Scheme
+        self.inner_adversary = inner_adversary
+    def challenge(self, pk: PK) -> Tuple[PT, PT]:
+        (m0, m1) = self.inner_adversary.challenge(pk)
+        return (m0, m1)
+    def guess(self, ct: CT) -> Crypto.Bit:
+        return self.inner_adversary.guess(ct)
+
+def wrapped_proof():
+    proof = Proof(WrappedPKE, PKE.INDCPA)
+    proof.add_distinguishing_proof_step(R, PKE.INDCPA, InnerPKE, "InnerPKE")
+    return proof
+
+def check_output(proof, **kwargs):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = proof.check(print_hops=True, print_canonicalizations=True, **kwargs)
+    return (result, out.getvalue())
+
+class TestProofCheck(unittest.TestCase):
+    def test_valid_proof(self):
+        proof = Proof(IgnoringPKE, PKE.INDCPA)
+        result, _ = check_output(proof)
+        self.assertTrue(result)
+        self.assertEqual(proof.proof_checked, "valid")
+
+    def test_invalid_proof(self):
+        proof = Proof(LeakingPKE, PKE.INDCPA)
+        result, _ = check_output(proof)
+        self.assertFalse(result)
+        self.assertEqual(proof.proof_checked, "invalid")
+
+    def test_distinguishing_step(self):
+        proof = wrapped_proof()
+        result, _ = check_output(proof)
+        self.assertTrue(result)
+        self.assertEqual(proof.proof_checked, "valid")
+
+    def test_workers_same_output(self):
+        for proof in [lambda: Proof(IgnoringPKE, PKE.INDCPA), lambda: Proof(LeakingPKE, PKE.INDCPA), wrapped_proof]:
+            serial = check_output(proof())
+            for workers in [1, 2]:
+                self.assertEqual(check_output(proof(), workers = workers), serial)
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for workers in [None, 2]:
+                with self.subTest(workers = workers):
+                    path = os.path.join(tmpdir, f"canonical_{workers}.sqlite")
+                    # each of the 4 games of the proof is looked up once per run
+                    cache = CanonicalizationCache(path)
+                    first = check_output(wrapped_proof(), workers = workers, cache = cache)
+                    self.assertEqual((cache.hits, cache.misses), (0, 4))
+                    cache = CanonicalizationCache(path)
+                    second = check_output(wrapped_proof(), workers = workers, cache = cache)
+                    self.assertEqual((cache.hits, cache.misses), (4, 0))
+                    self.assertEqual(first, second)
+
+    def test_profile(self):
+        profile = Profile()
+        self.assertTrue(check_output(wrapped_proof(), profile = profile)[0])
+        categories = [ span.category for span in profile.spans ]
+        self.assertEqual(categories.count('proof'), 1)
+        self.assertEqual(categories.count('inline'), 4)
+        self.assertEqual(categories.count('hop'), 4)
+        self.assertEqual(categories.count('game'), 4)
+        # canonicalizations happen inside their hop, inside the proof
+        for game, hop in zip([ s for s in profile.spans if s.category == 'game' ], [ s for s in profile.spans if s.category == 'hop' ]):
+            self.assertGreaterEqual(game.start, hop.start)
+            self.assertLessEqual(game.start + game.duration, hop.start + hop.duration)
+        self.assertEqual(profile.spans[-1].category, 'proof')
+
+    def test_memoized_games(self):
+        proof = wrapped_proof()
+        # a rewriting step that changes nothing, so that games 0 and 1 have the same source as the starting game
+        proof.insert_simple_rewriting_proof_step_after({}, 0)
+        profile = Profile()
+        self.assertTrue(check_output(proof, profile = profile)[0])
+        categories = [ span.category for span in profile.spans ]
+        self.assertEqual(categories.count('hop'), 6)
+        self.assertEqual(categories.count('game'), 4)
+        # checking again reuses all the canonicalizations
+        profile = Profile()
+        self.assertTrue(check_output(proof, profile = profile)[0])
+        self.assertEqual([ span.category for span in profile.spans ].count('game'), 0)
+
+    def test_memoized_game_src_invalidated(self):
+        proof = wrapped_proof()
+        ending_game = proof.get_game_src(1, False)
+        self.assertIs(proof.get_game_src(-1, False), ending_game)
+        proof.add_distinguishing_proof_step(R, PKE.INDCPA, InnerPKE, "InnerPKE")
+        self.assertNotEqual(proof.get_game_src(1, False), ending_game)
+        self.assertEqual(proof.get_game_src(1, False), proof.proof_steps[1].get_left_src())
+        self.assertEqual(proof.get_game_src(2, False), ending_game)
+
+class TestHops(unittest.TestCase):
+    def test_hop_results(self):
+        proof = wrapped_proof()
+        hops = list(proof.hops())
+        self.assertEqual([ hop.gamenum for hop in hops ], [0, 1])
+        self.assertTrue(all(hop.valid for hop in hops))
+        self.assertEqual(proof.proof_checked, "valid")
+        self.assertEqual(hops[0].left_description, proof.get_game_description(0, True))
+        self.assertEqual(hops[1].right_src, proof.get_game_src(1, False))
+        self.assertEqual(hops[0].left.fingerprint, hops[0].right.fingerprint)
+        self.assertNotEqual(hops[0].left.fingerprint, hops[1].left.fingerprint)
+        self.assertGreaterEqual(hops[0].seconds, 0)
+
+    def test_invalid_hop(self):
+        proof = Proof(LeakingPKE, PKE.INDCPA)
+        (hop,) = proof.hops()
+        self.assertFalse(hop.valid)
+        self.assertEqual(proof.proof_checked, "invalid")
+        self.assertIn("- ", hop.diff())
+        self.assertIn("+ ", hop.diff())
+
+    def test_stop_early(self):
+        proof = wrapped_proof()
+        profile = Profile()
+        hops = proof.hops(workers = 2, profile = profile)
+        self.assertEqual(next(hops).gamenum, 0)
+        hops.close()
+        self.assertEqual(proof.proof_checked, "unchecked")
+        self.assertEqual(profile.spans[-1].category, 'proof')
+
+class TestHybridProofStep(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_valid_hybrid(self):
+        module = load_module(hybrid_module(3), self.tmpdir.name, "hybrid_valid")
+        proof = module.proof()
+        self.assertEqual([ (type(step), step.index) for step in proof.proof_steps ], [ (HybridProofStep, i) for i in range(3) ])
+        result, out = check_output(proof)
+        self.assertTrue(result)
+        self.assertIn("reduction hybrid_valid.MultiReduction with hybrid = 2 inlined into game PKE.INDCPA_Right", out)
+        # the reduction was inlined into each side of the experiment once
+        self.assertEqual(len(proof.proof_steps[0].hybrid.inlined), 2)
+        self.assertEqual(proof.advantage_bound().splitlines()[2:], [
+            "3 × Advantage of reduction hybrid_valid.MultiReduction with hybrid uniformly random in 0, ..., 2 in experiment PKE.INDCPA for PKE scheme InnerPKE",
+        ])
+
+    def test_invalid_hybrid(self):
+        module = load_module(hybrid_module(3, valid = False), self.tmpdir.name, "hybrid_invalid")
+        result, _ = check_output(module.proof(), abort_on_failure = False)
+        self.assertFalse(result)
+
+    def test_hybrid_between_other_steps(self):
+        module = load_module(hybrid_module(2), self.tmpdir.name, "hybrid_rewritten")
+        proof = module.proof()
+        proof.insert_simple_rewriting_proof_step_after({ "Crypto.Bit(0)": "Crypto.Bit(0)" }, 0)
+        proof.insert_simple_rewriting_proof_step_after({ "Crypto.Bit(0)": "Crypto.Bit(0)" })
+        self.assertTrue(check_output(proof)[0])
+        self.assertEqual(proof.advantage_bound().splitlines()[2:], [
+            "0 (Rewriting step)",
+            "+",
+            "2 × Advantage of reduction hybrid_rewritten.MultiReduction with hybrid uniformly random in 0, ..., 1 in experiment PKE.INDCPA for PKE scheme InnerPKE",
+            "+",
+            "0 (Rewriting step)",
+        ])
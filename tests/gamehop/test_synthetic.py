@@ -0,0 +1,50 @@
+import ast
+import contextlib
+import io
+import tempfile
+import unittest
+
+import gamehop.verification as verification
+from gamehop.synthetic import Synthesizer, load_module
+
+SHAPES = [
+    dict(),
+    dict(if_depth = 3),
+    dict(tuples = True),
+    dict(lambdas = True),
+    dict(oracles = 2, if_depth = 2, tuples = True, lambdas = True),
+]
+
+class TestSynthesizer(unittest.TestCase):
+    def test_deterministic(self):
+        s = Synthesizer(seed = 5, statements = 20, oracles = 1, if_depth = 2, tuples = True, lambdas = True)
+        self.assertEqual(s.game(), s.game())
+        self.assertEqual(s.game(variant = True), s.game(variant = True))
+        self.assertNotEqual(s.game(), s.game(variant = True))
+
+    def test_shape(self):
+        s = Synthesizer(statements = 30, oracles = 3, oracle_statements = 4)
+        cdef = ast.parse(s.game()).body[0]
+        assert isinstance(cdef, ast.ClassDef)
+        self.assertEqual([f.name for f in cdef.body if isinstance(f, ast.FunctionDef)], ['__init__', 'main', 'o_0', 'o_1', 'o_2'])
+        # the prologue, the statements asked for, those combining the values, the members set, the guess and the return
+        main = cdef.body[1]
+        assert isinstance(main, ast.FunctionDef)
+        self.assertGreaterEqual(len(main.body), 1 + 30 + 3 + 2)
+
+    def test_variant_canonicalizes_equal(self):
+        for seed in range(3):
+            for shape in SHAPES:
+                with self.subTest(seed = seed, shape = shape):
+                    s = Synthesizer(seed = seed, statements = 15, **shape)
+                    self.assertEqual(verification.canonicalize_game(s.game()), verification.canonicalize_game(s.game(variant = True)))
+
+    def test_proof_module(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for (i, shape) in enumerate(SHAPES):
+                for valid in [True, False]:
+                    with self.subTest(shape = shape, valid = valid):
+                        s = Synthesizer(seed = i, statements = 10, **shape)
+                        module = load_module(s.proof_module(valid), tmpdir, f"synthetic_proof_{i}_{valid}")
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            self.assertEqual(module.proof().check(abort_on_failure = False), valid)
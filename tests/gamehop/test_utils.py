@@ -64,3 +64,56 @@ class TestAttributeNodeReplacer(unittest.TestCase):
             ast.unparse(x),
             expected_result(f_expected_result)
         )
+
+class TestParseCache(unittest.TestCase):
+    def test_copies(self):
+        class C():
+            def f(self):
+                return 1
+        def g(x):
+            return x
+        cache = gamehop.utils.parse_cache
+        (hits, misses) = (cache.hits, cache.misses)
+        cdef = gamehop.utils.get_class_def(C)
+        cdef.name = 'D'
+        self.assertEqual(gamehop.utils.get_class_def(C).name, 'C')
+        fdef = gamehop.utils.get_function_def(g)
+        fdef.body = []
+        self.assertEqual(ast.unparse(gamehop.utils.get_function_def(g)), "def g(x):\n    return x")
+        self.assertEqual((cache.hits - hits, cache.misses - misses), (2, 2))
+
+    def test_source_changed(self):
+        cache = gamehop.utils.ParseCache()
+        def f():
+            return 1
+        fdef = cache.get(f)
+        cache.entries[f] = (cache.entries[f][0] - 1, ast.parse("def f(): return 2").body[0])
+        self.assertEqual(ast.unparse(cache.get(f)), ast.unparse(fdef))
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        cache.get(f)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+class TestCopyAST(unittest.TestCase):
+    def test_copy(self):
+        t = ast.parse("def f(x):\n    y = g(x) + [1, 2]\n    return y").body[0]
+        t.extra = 'kept'
+        c = gamehop.utils.copy_ast(t)
+        self.assertEqual(ast.dump(c, include_attributes = True), ast.dump(t, include_attributes = True))
+        self.assertEqual(c.extra, 'kept')
+        for (n, m) in zip(ast.walk(t), ast.walk(c)):
+            if n._fields: self.assertIsNot(n, m)
+            else: self.assertIs(n, m)
+        c.body[0].targets[0].id = 'z'
+        c.body.pop()
+        self.assertEqual(ast.unparse(t), "def f(x):\n    y = g(x) + [1, 2]\n    return y")
+
+class TestSubstituteVariables(unittest.TestCase):
+    def test_swap(self):
+        f = ast.parse("def f(a, b):\n    c = g(a, b)\n    return c").body[0]
+        gamehop.utils.substitute_function_body_variables(f, { 'a': 'b', 'b': 'c', 'c': 'a' })
+        self.assertEqual(ast.unparse(f), "def f(b, c):\n    a = g(b, c)\n    return a")
+
+    def test_new_name_exists(self):
+        f = ast.parse("def f(a):\n    c = g(a)\n    return c").body[0]
+        with self.assertRaises(ValueError):
+            gamehop.utils.substitute_function_body_variables(f, { 'a': 'g' })
@@ -36,3 +36,35 @@ class TestCanonicalizeGame(unittest.TestCase):
         c = gamehop.utils.get_class_def(G)
         s = gamehop.verification.canonicalize_game(c)
         self.assertEqual(s, expected_result(G_expected_result))
+
+class G_renamed(Crypto.Game):
+    def main(self):
+        self.k = 1
+        out = run(self.o_test)
+        return out
+    def o_test(self, c):
+        return self.k + c
+
+def f(x):
+    y = g(x)
+    return y
+
+def f_renamed(a):
+    return g(a)
+
+class TestCanonicalFingerprint(unittest.TestCase):
+
+    def test_game(self):
+        self.assertEqual(gamehop.verification.canonical_fingerprint(G), gamehop.verification.canonical_fingerprint(G_renamed))
+        self.assertEqual(gamehop.verification.canonical_fingerprint(G), gamehop.verification.canonical_fingerprint(inspect.getsource(G_renamed)))
+        self.assertEqual(gamehop.verification.canonical_fingerprint(G), gamehop.verification.canonical_fingerprint(G_expected_result))
+        self.assertNotEqual(gamehop.verification.canonical_fingerprint(G), gamehop.verification.canonical_fingerprint(inspect.getsource(G_renamed).replace("self.k + c", "c + self.k")))
+        form = gamehop.verification.canonical_game(G)
+        self.assertEqual(form.source, gamehop.verification.canonicalize_game(G))
+        self.assertEqual(form.fingerprint, gamehop.verification.fingerprint(form.source))
+
+    def test_function(self):
+        self.assertEqual(gamehop.verification.canonical_fingerprint(f), gamehop.verification.canonical_fingerprint(f_renamed))
+        self.assertEqual(gamehop.verification.canonical_fingerprint(f), gamehop.verification.canonical_fingerprint("def h(b):\n    return g(b)"))
+        self.assertNotEqual(gamehop.verification.canonical_fingerprint(f), gamehop.verification.canonical_fingerprint("def h(b):\n    return g(g(b))"))
+        self.assertEqual(gamehop.verification.canonical_function(f).source, gamehop.verification.canonicalize_function(f))
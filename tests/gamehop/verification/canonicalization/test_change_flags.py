@@ -0,0 +1,170 @@
+import ast
+import functools
+import unittest
+import unittest.mock
+
+import gamehop.utils as utils
+import gamehop.verification as verification
+import gamehop.verification.canonicalization as canonicalization
+import gamehop.verification.canonicalization.classes
+import gamehop.verification.canonicalization.expand as expand
+import gamehop.verification.canonicalization.ifstatements as ifstatements
+import gamehop.verification.canonicalization.simplify as simplify
+from gamehop.primitives import Crypto
+
+import test_canonicalize
+import test_canonicalize_game
+
+def f_lambda(x, y):
+    g = lambda z: z + x
+    r = g(y)
+    return r
+
+def f_if(x):
+    if x:
+        y = 1
+    else:
+        y = 2
+    return y
+
+def f_noncompact(x):
+    y = g(h(x))
+    return y
+
+def f_useless_assign(x):
+    y = x
+    z = g(y)
+    return z
+
+def f_simplifiable(x):
+    y = x + 0
+    return y
+
+def f_unordered(x):
+    a = g(x)
+    b = h(x)
+    c = a + b
+    return c
+
+def f_dead_line(x):
+    a = g(x)
+    b = h(x)
+    return a
+
+def f_arguments(x, y, z):
+    a = g(z, x)
+    return a
+
+def f_canonical(v0):
+    v1 = g(v0)
+    return v1
+
+def f_tuple_argument(a, b):
+    x = g((a, b))
+    return x
+
+class G_members(Crypto.Game):
+    def main(self):
+        self.k = 1
+        return self.k
+
+class G_tuple_argument(Crypto.Game):
+    def __init__(self, Adversary):
+        self.adversary = Adversary()
+    def main(self):
+        a = Crypto.UniformlySample(int)
+        b = Crypto.UniformlySample(int)
+        r = self.adversary.guess((a, b))
+        return r
+
+class TestChangeFlags(unittest.TestCase):
+    def assertChangeFlag(self, canonicalize, f, expected):
+        fdef = utils.get_function_def(f)
+        self.assertEqual(canonicalize(fdef), expected)
+
+    def test_inline_lambdas(self):
+        self.assertChangeFlag(canonicalization.inline_lambdas, f_lambda, True)
+        self.assertChangeFlag(canonicalization.inline_lambdas, f_canonical, False)
+
+    def test_if_statements_to_expressions(self):
+        self.assertChangeFlag(ifstatements.if_statements_to_expressions, f_if, True)
+        self.assertChangeFlag(ifstatements.if_statements_to_expressions, f_canonical, False)
+
+    def test_expand_non_compact_expressions(self):
+        self.assertChangeFlag(expand.expand_non_compact_expressions, f_noncompact, True)
+        self.assertChangeFlag(expand.expand_non_compact_expressions, f_canonical, False)
+        self.assertChangeFlag(expand.expand_non_compact_expressions, f_tuple_argument, True)
+        self.assertChangeFlag(lambda f: expand.expand_non_compact_expressions(f, compact_tuples = True), f_tuple_argument, False)
+
+    def test_canonicalize_function_name(self):
+        self.assertChangeFlag(canonicalization.canonicalize_function_name, f_canonical, True)
+        fdef = utils.get_function_def(f_canonical)
+        fdef.name = 'f'
+        self.assertFalse(canonicalization.canonicalize_function_name(fdef))
+
+    def test_collapse_useless_assigns(self):
+        self.assertChangeFlag(canonicalization.collapse_useless_assigns, f_useless_assign, True)
+        self.assertChangeFlag(canonicalization.collapse_useless_assigns, f_canonical, False)
+
+    def test_simplify_function(self):
+        self.assertChangeFlag(simplify.simplify_function, f_simplifiable, True)
+        self.assertChangeFlag(simplify.simplify_function, f_canonical, False)
+
+    def test_canonicalize_line_order(self):
+        self.assertChangeFlag(canonicalization.canonicalize_line_order, f_unordered, False)
+        self.assertChangeFlag(canonicalization.canonicalize_line_order, f_dead_line, True)
+        self.assertChangeFlag(canonicalization.canonicalize_line_order, f_canonical, False)
+
+    def test_canonicalize_argument_order(self):
+        self.assertChangeFlag(canonicalization.canonicalize_argument_order, f_arguments, True)
+        self.assertChangeFlag(canonicalization.canonicalize_argument_order, f_canonical, False)
+
+    def test_canonicalize_variable_names(self):
+        self.assertChangeFlag(canonicalization.canonicalize_variable_names, f_useless_assign, True)
+        self.assertChangeFlag(canonicalization.canonicalize_variable_names, f_canonical, False)
+
+    def test_unnecessary_members(self):
+        cdef = utils.get_class_def(G_members)
+        self.assertTrue(canonicalization.classes.unnecessary_members(cdef))
+        self.assertFalse(canonicalization.classes.unnecessary_members(cdef))
+
+class TestFixpoint(unittest.TestCase):
+    def test_tuple_argument_function(self):
+        self.assertEqual(
+            verification.canonicalize_function(f_tuple_argument, debug = True),
+            "def f(v0, v1):\n    v2 = g((v0, v1))\n    return v2"
+        )
+
+    def test_tuple_argument_game(self):
+        s = verification.canonicalize_game(G_tuple_argument, debug = True)
+        self.assertIn("v3 = v0.adversary.guess((v1, v2))", s)
+
+    def test_debug_same_result(self):
+        for f in [f_lambda, f_if, f_noncompact, f_useless_assign, f_simplifiable, f_unordered, f_dead_line, f_arguments, f_canonical, f_tuple_argument]:
+            with self.subTest(f = f.__name__):
+                self.assertEqual(verification.canonicalize_function(f, debug = True), verification.canonicalize_function(f))
+        for c in [G_members, G_tuple_argument]:
+            with self.subTest(c = c.__name__):
+                self.assertEqual(verification.canonicalize_game(c, debug = True), verification.canonicalize_game(c))
+
+    def test_check_fixpoint(self):
+        fdef = utils.get_function_def(f_canonical)
+        s = ast.unparse(fdef)
+        self.assertEqual(verification.check_fixpoint(fdef, False, s), s)
+        with self.assertRaises(AssertionError):
+            verification.check_fixpoint(fdef, True, s)
+        with self.assertRaises(AssertionError):
+            verification.check_fixpoint(fdef, False, "")
+
+    def test_debug_corpus(self):
+        # rerun the canonicalization tests with the fixpoint cross-check enabled
+        canonicalize_function = functools.partial(verification.canonicalize_function, debug = True)
+        canonicalize_game = functools.partial(verification.canonicalize_game, debug = True)
+        with unittest.mock.patch.object(verification, 'canonicalize_function', canonicalize_function), \
+             unittest.mock.patch.object(verification, 'canonicalize_game', canonicalize_game):
+            loader = unittest.TestLoader()
+            suite = unittest.TestSuite([loader.loadTestsFromModule(test_canonicalize), loader.loadTestsFromModule(test_canonicalize_game)])
+            result = unittest.TestResult()
+            suite.run(result)
+        self.assertTrue(result.wasSuccessful(), result.errors + result.failures)
+        self.assertGreater(result.testsRun, 0)
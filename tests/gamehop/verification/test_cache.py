@@ -0,0 +1,96 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import unittest
+
+from gamehop.primitives import Crypto
+import gamehop.verification as verification
+from gamehop.verification import CanonicalForm
+from gamehop.verification.cache import CanonicalizationCache, cache_key, default_cache
+
+A = CanonicalForm("a", "A")
+B = CanonicalForm("b", "B")
+
+class G1(Crypto.Game):
+    def main(self):
+        x = 1
+        y = x + 2
+        return y
+
+class G2(Crypto.Game):
+    def main(self):
+        r = run(2)
+        return r
+
+class TestCanonicalizationCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "canonical.sqlite")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key_ignores_formatting(self):
+        src = "class G(Crypto.Game):\n    def main(self):\n        return   1 # comment"
+        self.assertEqual(cache_key(src), cache_key("class G(Crypto.Game):\n    def main(self):\n        return 1"))
+        self.assertNotEqual(cache_key(src), cache_key(G1))
+
+    def test_canonicalize_game(self):
+        cache = CanonicalizationCache(self.path)
+        self.assertEqual(cache.canonicalize_game(G1), verification.canonicalize_game(G1))
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertEqual(cache.canonicalize_game(G1), verification.canonicalize_game(G1))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # persists across connections
+        cache2 = CanonicalizationCache(self.path)
+        self.assertEqual(cache2.get(cache_key(G1)), verification.canonical_game(G1))
+        self.assertEqual(cache2.canonical_game(G1), verification.canonical_game(G1))
+
+    def test_lru_eviction(self):
+        cache = CanonicalizationCache(self.path, max_entries = 2)
+        cache.put("a", A)
+        cache.put("b", B)
+        cache.get("a")
+        cache.put("c", CanonicalForm("c", "C"))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("a"), A)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("c"), CanonicalForm("c", "C"))
+
+    def test_no_eviction_at_capacity(self):
+        cache = CanonicalizationCache(self.path, max_entries = 2)
+        cache.put("a", A)
+        cache.put("b", B)
+        cache.put("b", CanonicalForm("b2", "B2"))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("a"), A)
+        self.assertEqual(cache.get("b"), CanonicalForm("b2", "B2"))
+
+    def test_pickle(self):
+        cache = CanonicalizationCache(self.path)
+        cache.put("a", A)
+        cache2 = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(cache2.get("a"), A)
+
+    def test_old_table_dropped(self):
+        con = sqlite3.connect(self.path)
+        con.execute("CREATE TABLE canonical (key TEXT PRIMARY KEY, canonical TEXT NOT NULL, last_used INTEGER NOT NULL)")
+        con.commit()
+        con.close()
+        cache = CanonicalizationCache(self.path)
+        cache.put("a", A)
+        self.assertEqual(cache.get("a"), A)
+        self.assertEqual([row[0] for row in cache.connection().execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'canonical%'")], ["canonical_forms"])
+
+    def test_default_cache(self):
+        old = os.environ.pop("GAMEHOP_CACHE_DIR", None)
+        try:
+            self.assertIsNone(default_cache())
+            os.environ["GAMEHOP_CACHE_DIR"] = self.tmpdir.name
+            cache = default_cache()
+            assert cache is not None
+            self.assertEqual(cache.path, self.path)
+        finally:
+            if old is None: os.environ.pop("GAMEHOP_CACHE_DIR", None)
+            else: os.environ["GAMEHOP_CACHE_DIR"] = old
@@ -0,0 +1,91 @@
+import ast
+import unittest
+
+import gamehop.verification as verification
+from gamehop.primitives import Crypto
+from gamehop.verification.pass_manager import PassManager
+
+class Countdown():
+    """A pass that reports a change the first n times it is run."""
+    def __init__(self, n):
+        self.n = n
+    def __call__(self, node):
+        if self.n == 0: return False
+        self.n -= 1
+        return True
+
+def f(x):
+    y = x + 0
+    z = g(y)
+    return z
+
+class G(Crypto.Game):
+    def __init__(self, Adversary):
+        self.adversary = Adversary()
+    def main(self):
+        self.k = 1
+        r = self.adversary.guess(self.k)
+        return r
+    def o_a(self, x):
+        y = x + 0
+        return y
+    def o_b(self, x):
+        return x
+
+class TestPassManager(unittest.TestCase):
+    def test_only_enabled_passes_rerun(self):
+        manager = PassManager([('a', Countdown(2)), ('b', Countdown(0)), ('c', Countdown(1))], { 'a': ['a'], 'c': ['b'] })
+        node = ast.parse("")
+        rounds = 0
+        while manager.pending():
+            manager.run_round(node)
+            rounds += 1
+        self.assertEqual(manager.counts, { 'a': 3, 'b': 2, 'c': 1 })
+        self.assertEqual(rounds, 3)
+
+    def test_enabled_later_pass_runs_in_same_round(self):
+        manager = PassManager([('a', Countdown(1)), ('b', Countdown(0))], { 'a': ['b'] })
+        node = ast.parse("")
+        self.assertTrue(manager.run_round(node))
+        self.assertEqual(manager.counts, { 'a': 1, 'b': 1 })
+        self.assertFalse(manager.pending())
+
+    def test_check_done(self):
+        manager = PassManager([('a', Countdown(1))], {})
+        manager.run_round(ast.parse(""))
+        manager.check_done(ast.parse(""))
+        manager = PassManager([('a', Countdown(2))], {})
+        manager.run_round(ast.parse(""))
+        with self.assertRaises(AssertionError):
+            manager.check_done(ast.parse(""))
+
+    def test_canonicalize_function_counts(self):
+        counts = dict()
+        s = verification.canonicalize_function(f, pass_counts = counts)
+        self.assertEqual(s, verification.canonicalize_function(f, debug = True))
+        # this takes three rounds, so with a fixed round-robin each pass would have run three times
+        self.assertEqual(counts, {
+            'inline_lambdas': 3,
+            'if_statements_to_expressions': 3,
+            'expand_non_compact_expressions': 3,
+            'canonicalize_function_name': 1,
+            'collapse_useless_assigns': 3,
+            'simplify': 2,
+            'canonicalize_line_order': 2,
+            'canonicalize_argument_order': 2,
+            'canonicalize_variable_names': 2,
+        })
+
+    def test_canonicalize_game_counts(self):
+        counts = dict()
+        s = verification.canonicalize_game(G, pass_counts = counts)
+        self.assertEqual(s, verification.canonicalize_game(G, debug = True))
+        self.assertEqual(counts, {
+            'if_statements_to_expressions': 7,
+            'expand_non_compact_expressions': 7,
+            'collapse_useless_assigns': 7,
+            'simplify': 5,
+            'canonicalize_line_order': 4,
+            'canonicalize_variable_names': 5,
+            'unnecessary_members': 2,
+        })
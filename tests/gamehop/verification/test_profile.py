@@ -0,0 +1,47 @@
+import ast
+import json
+import os
+import tempfile
+import unittest
+
+import gamehop.verification as verification
+from gamehop.verification.profile import Profile, count_nodes
+
+import test_pass_manager
+
+class TestProfile(unittest.TestCase):
+    def test_canonicalize_function(self):
+        profile = Profile()
+        counts = dict()
+        s = verification.canonicalize_function(test_pass_manager.f, pass_counts = counts, profile = profile)
+        self.assertEqual(s, verification.canonicalize_function(test_pass_manager.f))
+        stats = profile.pass_stats()
+        self.assertEqual({ name: stats[name].runs for name in stats }, counts)
+        self.assertEqual(stats['simplify'].changes, 1)
+        self.assertEqual(profile.rounds(), 3)
+        self.assertEqual([span.category for span in profile.spans if span.category != 'pass'], ['round', 'round', 'round', 'function'])
+        self.assertEqual(profile.spans[-1].args, { 'rounds': 3, 'nodes': count_nodes(ast.parse(s).body[0]) })
+
+    def test_canonicalize_game(self):
+        profile = Profile()
+        counts = dict()
+        verification.canonicalize_game(test_pass_manager.G, pass_counts = counts, profile = profile)
+        stats = profile.pass_stats()
+        self.assertEqual({ name: stats[name].runs for name in stats }, counts)
+        self.assertEqual({ span.args['function'] for span in profile.spans if span.name == 'collapse_useless_assigns' }, { '__init__', 'main', 'o_a', 'o_b' })
+        self.assertEqual(profile.spans[-1].category, 'game')
+        self.assertEqual(profile.spans[-1].name, 'G')
+
+    def test_chrome_trace(self):
+        profile = Profile()
+        verification.canonicalize_function(test_pass_manager.f, profile = profile)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "trace.json")
+            profile.write_chrome_trace(path)
+            with open(path) as fh:
+                trace = json.load(fh)
+        events = trace['traceEvents']
+        self.assertEqual(len(events), len(profile.spans))
+        # the outermost span comes first and starts at 0
+        self.assertEqual((events[0]['cat'], events[0]['ts']), ('function', 0))
+        self.assertTrue(all(event['ph'] == 'X' and event['dur'] >= 0 for event in events))